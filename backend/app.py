@@ -1,38 +1,78 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import os
+import uuid
+import hmac
+import secrets
+import hashlib
+import threading
 import zipfile
 import logging
-from io import BytesIO
+import logging.handlers
+import queue
+import atexit
+import orjson
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
 
-from services.scraper import ImageScraper
-from services.image_processor import ImageProcessor
-from services.video_generator import VideoGenerator
-from services.page_analyzer import PageAnalyzer
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+# Pillow / BeautifulSoup / fal_client などの重いライブラリは各エンドポイント内で遅延インポートする
+# （/health などでは読み込まない）
 from services.exceptions import ContentPolicyViolationError
+from services.store import KeyValueStore
+
+if TYPE_CHECKING:
+    from services.video_generator import VideoGenerator
 
 # 環境変数をロード（システム環境変数をオーバーライド）
 load_dotenv(override=True)
 
 # ログ設定（ファイルとコンソールの両方に出力）
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv('LOG_LEVEL', 'DEBUG').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler('debug.log'),  # ファイルに出力
         logging.StreamHandler()  # コンソールにも出力
     ]
 )
+
+# ファイル・コンソールへの書き込みはバックグラウンドスレッドで行う（リクエスト処理のスレッドをブロックしない）
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, *logging.root.handlers, respect_handler_level=True)
+logging.root.handlers = [logging.handlers.QueueHandler(_log_queue)]
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 logger = logging.getLogger(__name__)
 
+
+class OrjsonProvider(JSONProvider):
+    """jsonify / request.json を orjson で処理する JSON プロバイダー"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        # 文字列を経由せず orjson が返す bytes をそのままレスポンスにする
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 # CORS設定: ローカル、ngrok、FTPサーバーからのアクセスを許可
 CORS(app, resources={
     r"/api/*": {
         "origins": "*",  # すべてのオリジンを許可（開発・Colab使用時）
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type"]
+        "allow_headers": ["Content-Type", "If-None-Match"],
+        "expose_headers": ["ETag"]
     }
 })
 
@@ -40,10 +80,74 @@ CORS(app, resources={
 FAL_KEY = os.getenv('FAL_KEY')
 LAMBDA_SECRET_KEY = os.getenv('LAMBDA_SECRET_KEY')
 
+# fal-ai の webhook 送信先（未設定の場合はバックグラウンドスレッドで生成を待つ）
+PUBLIC_URL = os.getenv('PUBLIC_URL', '').rstrip('/')
+
+# 実行中の処理（キー: (処理名, URL)）。同じURLへの同時リクエストは1回の処理にまとめる
+# （最初のリクエストが自身のスレッドで実行し、後続のリクエストは Future で結果を待つ）
+_inflight: Dict[Tuple[str, str], Future] = {}
+_inflight_lock = threading.RLock()
+
+# 動画生成ジョブ用（数分かかるのでリクエスト処理とは別のプール）
+job_executor = ThreadPoolExecutor(max_workers=4)
+
+# 動画生成ジョブの状態（キー: ジョブID）
+job_store = KeyValueStore('job:')
+
+# 生成済み動画の結果（キー: キャラクター画像URL + プロンプトのハッシュ）
+VIDEO_CACHE_TTL = 86400
+video_cache = KeyValueStore('vid:', ttl=VIDEO_CACHE_TTL)
+
+# コンテンツポリシー違反時にユーザーへ提示する対処法
+CONTENT_POLICY_SUGGESTIONS = [
+    '画像の背景をシンプルにする',
+    '明るい照明の画像を使用する',
+    'キャラクターの全身が写っている画像を避ける',
+    'ロゴやイラストなど、人物以外の画像を試す'
+]
+
+
+def _single_flight(key: Tuple[str, str], fn, *args):
+    """
+    同じキーの処理が実行中であればその結果を待ち、なければ呼び出し元のスレッドで実行する
+    （同じURLの同時リクエストでスクレイピング・Gemini呼び出しを重複させない）
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not is_leader:
+        return future.result()
+
+    try:
+        result = fn(*args)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            if _inflight.get(key) is future:
+                del _inflight[key]
+
+
+def _analyze_page(page_url: str) -> dict:
+    """ページを分析（同じURLの同時リクエストでは1回だけ実行される）"""
+    from services.page_analyzer import PageAnalyzer
+
+    return PageAnalyzer(LAMBDA_SECRET_KEY).analyze_page(page_url)
+
 
 @app.route('/api/extract-images', methods=['POST'])
 def extract_images():
     """指定されたURLから画像を抽出"""
+    from services.scraper import ImageScraper
+
     try:
         data = request.json
         page_url = data.get('page_url')
@@ -74,50 +178,47 @@ def analyze_page():
             logger.error("❌ No page_url provided")
             return jsonify({'error': 'page_url is required'}), 400
 
-        logger.info(f"🔍 Analyzing page: {page_url}")
+        logger.info("🔍 Analyzing page: %s", page_url)
 
-        # ページを分析
-        analyzer = PageAnalyzer(LAMBDA_SECRET_KEY)
-        result = analyzer.analyze_page(page_url)
+        # ページを分析（キャラクター画像URLも同じHTMLから抽出される）
+        result = _single_flight(('analyze', page_url), _analyze_page, page_url)
 
         if 'error' in result:
-            logger.error(f"❌ Analysis failed: {result['error']}")
+            logger.error("❌ Analysis failed: %s", result['error'])
             return jsonify(result), 500
 
-        # キャラクター画像URLも取得
-        try:
-            scraper = ImageScraper(page_url)
-            images = scraper.extract_images()
-            result['character_image_url'] = images.get('character_url', '')
-            logger.info(f"✅ Character image URL: {result['character_image_url']}")
-        except Exception as e:
-            logger.warning(f"⚠️ Failed to extract character image: {str(e)}")
-            result['character_image_url'] = ''
+        logger.info("✅ Character image URL: %s", result.get('character_image_url', ''))
 
-        logger.info(f"✅ Analysis complete. Generated prompt length: {len(result.get('generated_prompt', ''))}")
+        logger.info("✅ Analysis complete. Generated prompt length: %d", len(result.get('generated_prompt', '')))
         return jsonify(result), 200
 
     except Exception as e:
-        logger.error(f"❌ Fatal error in analyze_page: {str(e)}", exc_info=True)
+        logger.error("❌ Fatal error in analyze_page: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/generate-videos', methods=['POST'])
 def generate_videos():
     """画像から動画を生成"""
+    from services.scraper import ImageScraper
+    from services.image_processor import ImageProcessor
+    from services.video_generator import VideoGenerator
+    from services.page_analyzer import PageAnalyzer
+    from services.http import SESSION
+
     try:
         data = request.json
         page_url = data.get('page_url')
         custom_prompt = data.get('prompt')  # カスタムプロンプト
         product_info_data = data.get('product_info')  # 商材情報
         character_image_url = data.get('character_image_url')  # キャラクター画像URL
-        logger.info(f"🎬 Starting video generation for URL: {page_url}")
+        logger.info("🎬 Starting video generation for URL: %s", page_url)
         if custom_prompt:
-            logger.info(f"📝 Custom prompt provided: {custom_prompt}")
+            logger.info("📝 Custom prompt provided: %s", custom_prompt)
         if product_info_data:
-            logger.info(f"📊 Product info provided: {product_info_data}")
+            logger.info("📊 Product info provided: %s", product_info_data)
         if character_image_url:
-            logger.info(f"🖼️ Character image URL provided: {character_image_url}")
+            logger.info("🖼️ Character image URL provided: %s", character_image_url)
 
         if not page_url and not character_image_url:
             logger.error("❌ No page_url or character_image_url provided")
@@ -128,14 +229,14 @@ def generate_videos():
 
         # 優先順位: character_image_url > page_urlから抽出
         if character_image_url:
-            logger.info(f"✅ Using provided character image URL: {character_image_url}")
+            logger.info("✅ Using provided character image URL: %s", character_image_url)
             final_character_url = character_image_url
         else:
             logger.info("📸 Extracting character image from page...")
             scraper = ImageScraper(page_url)
             images = scraper.extract_images()
             final_character_url = images.get('character_url', '')
-            logger.info(f"✅ Character image extracted: {final_character_url}")
+            logger.info("✅ Character image extracted: %s", final_character_url)
 
         if not final_character_url:
             logger.error("❌ No character image URL available")
@@ -148,58 +249,193 @@ def generate_videos():
         final_prompt = custom_prompt
         if product_info_data:
             logger.info("🔄 Regenerating prompt from product info...")
-            analyzer = PageAnalyzer(LAMBDA_SECRET_KEY)
-            final_prompt = analyzer._generate_video_prompt(product_info_data)
-            logger.info(f"✅ Prompt regenerated: {final_prompt[:100]}...")
-
-        # Step 2 & 3: キャラクター動画を生成
+            # テンプレートへの埋め込みのみで Gemini は呼ばない
+            final_prompt = PageAnalyzer._generate_video_prompt(product_info_data)
+            logger.info("✅ Prompt regenerated: %s...", final_prompt[:100])
+
+        # 同じ画像・プロンプトで生成済みの場合は fal-ai を呼ばずに結果を返す
+        cache_key = _video_cache_key(final_character_url, final_prompt)
+        cached_result = video_cache.get(cache_key)
+        if cached_result:
+            # 未生成の場合と同じくジョブとして返す（クライアントはレスポンスの形を区別しなくてよい）
+            logger.info("✅ Returning cached video: %s", cached_result)
+            job_id = uuid.uuid4().hex
+            job = {**cached_result, 'job_id': job_id, 'status': 'success'}
+            job_store.set(job_id, job)
+            return jsonify(job), 200
+
+        # Step 2 & 3: キャラクター動画の生成ジョブを投入
         try:
             logger.info("🎨 Step 2: Processing character image...")
             # URLから画像をダウンロード
-            import requests as req
-            response = req.get(final_character_url, timeout=10)
+            response = SESSION.get(final_character_url, timeout=10)
             response.raise_for_status()
             character_data = response.content
-            logger.info(f"✅ Character image downloaded ({len(character_data)} bytes)")
+            logger.info("✅ Character image downloaded (%d bytes)", len(character_data))
 
             processed_character = processor.preprocess_image(character_data)
-            logger.info(f"✅ Character image preprocessed ({len(processed_character)} bytes)")
-
-            logger.info("🎥 Step 3: Generating character video with fal-ai...")
-            video_result = generator.generate_character_video(
-                processed_character,
-                prompt=final_prompt
-            )
-            logger.info(f"✅ Character video generated: {video_result}")
-
-            logger.info(f"🎉 Video generation complete")
-            return jsonify(video_result), 200
-
-        except ContentPolicyViolationError as e:
-            logger.error(f"❌ Content policy violation: {str(e)}")
-            return jsonify({
-                'error': str(e),
-                'error_type': 'content_policy_violation',
-                'suggestions': [
-                    '画像の背景をシンプルにする',
-                    '明るい照明の画像を使用する',
-                    'キャラクターの全身が写っている画像を避ける',
-                    'ロゴやイラストなど、人物以外の画像を試す'
-                ]
-            }), 400
+            logger.info("✅ Character image preprocessed (%d bytes)", len(processed_character))
+
+            logger.info("🎥 Step 3: Queueing character video generation with fal-ai...")
+            job_id = _queue_video_job(generator, processed_character, final_prompt, cache_key)
+            logger.info("✅ Video job queued: %s", job_id)
+
+            return jsonify({'job_id': job_id, 'status': 'queued'}), 202
 
         except Exception as e:
-            logger.error(f"❌ Character video generation failed: {str(e)}", exc_info=True)
+            logger.error("❌ Character video generation failed: %s", e, exc_info=True)
             return jsonify({'error': str(e)}), 500
 
     except Exception as e:
-        logger.error(f"❌ Fatal error in generate_videos: {str(e)}", exc_info=True)
+        logger.error("❌ Fatal error in generate_videos: %s", e, exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+def _video_cache_key(character_url: str, prompt: Optional[str]) -> str:
+    """生成済み動画キャッシュのキーを生成"""
+    return hashlib.blake2b((character_url + (prompt or '')).encode('utf-8')).hexdigest()
+
+
+def _queue_video_job(generator: 'VideoGenerator', image_data: bytes, prompt: str, cache_key: str) -> str:
+    """
+    動画生成ジョブを投入してジョブIDを返す（fal-ai へのアップロード・投入もバックグラウンドで行う）
+
+    PUBLIC_URL が設定されている場合は fal-ai のキューに投入し、完了時に webhook で結果を受け取る。
+    未設定の場合（ローカル開発時など）はバックグラウンドスレッドで生成完了を待つ。
+    """
+    # 投入直後に webhook が届いても見つかるよう、ジョブは投入前に登録する
+    job_id = uuid.uuid4().hex
+    job = {'job_id': job_id, 'status': 'queued', 'cache_key': cache_key}
+
+    if PUBLIC_URL:
+        # webhook の送信元を確認するためのジョブごとのトークン（ジョブの状態の取得結果には含めない）
+        job['webhook_token'] = secrets.token_urlsafe(32)
+        job_store.set(job_id, job)
+        job_executor.submit(_submit_webhook_job, generator, job_id, job['webhook_token'], image_data, prompt)
+        return job_id
+
+    job_store.set(job_id, job)
+    job_executor.submit(_run_video_job, generator, job_id, image_data, prompt)
+    return job_id
+
+
+def _submit_webhook_job(
+    generator: 'VideoGenerator',
+    job_id: str,
+    webhook_token: str,
+    image_data: bytes,
+    prompt: str
+) -> None:
+    """バックグラウンドで fal-ai のキューに投入（結果は webhook で受け取る）"""
+    try:
+        request_id = generator.submit_character_video(
+            image_data,
+            prompt=prompt,
+            webhook_url=f"{PUBLIC_URL}/api/fal-webhook?job={job_id}&token={webhook_token}"
+        )
+        job_store.update(job_id, request_id=request_id)
+
+    except ContentPolicyViolationError as e:
+        # 投入前に拒否された場合もバックグラウンド実行時と同じくジョブのエラーとして返す
+        logger.error("❌ Content policy violation: %s", e)
+        job_store.update(
+            job_id,
+            status='error',
+            error=str(e),
+            error_type='content_policy_violation',
+            suggestions=CONTENT_POLICY_SUGGESTIONS
+        )
+
+    except Exception as e:
+        logger.error("❌ Video job submission failed: %s", e, exc_info=True)
+        job_store.update(job_id, status='error', error=str(e))
+
+
+def _complete_video_job(job_id: str, video_result: dict) -> None:
+    """ジョブの結果を保存し、成功した場合は同じ入力での再生成に備えてキャッシュする"""
+    job = job_store.update(job_id, **video_result)
+    if video_result.get('status') == 'success' and job.get('cache_key'):
+        video_cache.set(job['cache_key'], video_result)
+
+
+def _run_video_job(generator: 'VideoGenerator', job_id: str, image_data: bytes, prompt: str) -> None:
+    """バックグラウンドで動画を生成し、結果をジョブストアに保存"""
+    job_store.update(job_id, status='running')
+    try:
+        video_result = generator.generate_video_from_image(
+            image_data,
+            prompt=prompt or generator.DEFAULT_CHARACTER_PROMPT,
+            duration=12
+        )
+        logger.info("✅ Character video generated: %s", video_result)
+        _complete_video_job(job_id, video_result)
+
+    except ContentPolicyViolationError as e:
+        logger.error("❌ Content policy violation: %s", e)
+        job_store.update(
+            job_id,
+            status='error',
+            error=str(e),
+            error_type='content_policy_violation',
+            suggestions=CONTENT_POLICY_SUGGESTIONS
+        )
+
+    except Exception as e:
+        logger.error("❌ Character video generation failed: %s", e, exc_info=True)
+        job_store.update(job_id, status='error', error=str(e))
+
+
+@app.route('/api/fal-webhook', methods=['POST'])
+def fal_webhook():
+    """fal-ai から動画生成結果を受け取る"""
+    from services.video_generator import VideoGenerator
+
+    try:
+        payload = request.json or {}
+        # ジョブIDは投入時に webhook のURLに付けたもの（fal-ai の request_id ではない）
+        job_id = request.args.get('job')
+
+        # 投入済みのジョブ以外は受け付けない
+        job = job_store.get(job_id) if job_id else None
+        if job is None:
+            logger.warning("⚠️ Webhook for unknown job: %s", job_id)
+            return jsonify({'error': 'unknown job'}), 404
+
+        # 投入時に発行したトークンと一致しない場合は偽装された結果として拒否する
+        expected_token = job.get('webhook_token') or ''
+        if not expected_token or not hmac.compare_digest(request.args.get('token', ''), expected_token):
+            logger.warning("⚠️ Webhook with invalid token for job: %s", job_id)
+            return jsonify({'error': 'invalid token'}), 403
+
+        generator = VideoGenerator(FAL_KEY)
+        video_result = generator.parse_webhook_result(payload)
+        if video_result.get('error_type') == 'content_policy_violation':
+            video_result['suggestions'] = CONTENT_POLICY_SUGGESTIONS
+
+        _complete_video_job(job_id, video_result)
+        logger.info("✅ Webhook received for job %s: %s", job_id, video_result['status'])
+        return jsonify({'status': 'ok'}), 200
+
+    except Exception as e:
+        logger.error("❌ Webhook handling failed: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/job/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """動画生成ジョブの状態を取得"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'job not found'}), 404
+    job.pop('webhook_token', None)
+    return jsonify(job), 200
+
+
 @app.route('/api/download-video', methods=['POST'])
 def download_video():
     """生成された動画をダウンロード"""
+    from services.video_generator import VideoGenerator
+
     try:
         data = request.json
         video_url = data.get('video_url')
@@ -208,20 +444,17 @@ def download_video():
             return jsonify({'error': 'video_url is required'}), 400
 
         generator = VideoGenerator(FAL_KEY)
-        video_data = generator.download_video(video_url)
-
-        video_buffer = BytesIO(video_data)
-        video_buffer.seek(0)
+        video_stream = generator.stream_video(video_url)
 
-        return send_file(
-            video_buffer,
+        # fal-ai からのダウンロードをそのままクライアントへ中継
+        return Response(
+            video_stream,
             mimetype='video/mp4',
-            as_attachment=True,
-            download_name='character_video.mp4'
+            headers={'Content-Disposition': 'attachment; filename=character_video.mp4'}
         )
 
     except Exception as e:
-        logger.error(f"❌ Video download failed: {str(e)}", exc_info=True)
+        logger.error("❌ Video download failed: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
@@ -232,4 +465,5 @@ def health():
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # 開発用サーバー（本番は gunicorn -c gunicorn_conf.py app:app で起動）
+    app.run(debug=os.getenv('FLASK_ENV') == 'development', host='0.0.0.0', port=5001)
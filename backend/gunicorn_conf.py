@@ -0,0 +1,24 @@
+"""
+gunicorn 設定ファイル
+
+起動方法:
+    gunicorn -c gunicorn_conf.py app:app
+"""
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# ジョブ状態・キャッシュは REDIS_URL 未設定時はプロセス内メモリに保存されるため、
+# Redis がない場合はワーカーを1つに限定する（スレッドで並列処理）
+_default_workers = multiprocessing.cpu_count() * 2 + 1 if os.getenv('REDIS_URL') else 1
+workers = int(os.getenv('WEB_CONCURRENCY', _default_workers))
+
+# I/O待ちが中心のため、ワーカーごとに複数スレッドでリクエストを処理
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+keepalive = 65
+
+# Gemini の呼び出し（最大60秒）を含むため長めに設定
+timeout = 120
@@ -3,9 +3,13 @@ Gemini API (Lambda経由) を呼び出すクライアントクラス
 PHPのChatGptClient.phpを参考に実装
 """
 import os
-import json
+import hashlib
 import logging
+import functools
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional, Dict
 
 logger = logging.getLogger(__name__)
@@ -32,6 +36,15 @@ class GeminiClient:
         """
         self.secret_key = secret_key or os.getenv('LAMBDA_SECRET_KEY')
 
+        # Lambda への接続を使い回すためのセッション
+        # （リトライは invoke_gemini_with_retry で行うのでアダプターでは行わない）
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(total=0)
+        ))
+
     def invoke_gemini(self, prompt: str, model: Optional[str] = None) -> str:
         """
         Gemini APIにリクエストを送信してレスポンスを取得
@@ -65,63 +78,68 @@ class GeminiClient:
                 'User-Agent': 'Mozilla/5.0 (compatible; PMaxHelper/1.0)'  # ブラウザのようなUser-Agent
             }
 
-            logger.info(f"📡 Calling Gemini Lambda API...")
-            logger.debug(f"Request URL: {self.LAMBDA_URL}")
-            logger.debug(f"Request method: POST")
-            logger.debug(f"Request headers: {headers}")
-            logger.debug(f"Model: {payload.get('model')}")
-            logger.debug(f"Prompt length: {len(prompt)} characters")
-            logger.debug(f"Payload: {payload}")
+            logger.info("📡 Calling Gemini Lambda API...")
+            logger.debug("Request URL: %s", self.LAMBDA_URL)
+            logger.debug("Request method: POST")
+            logger.debug("Request headers: %s", headers)
+            logger.debug("Model: %s", payload.get('model'))
+            # プロンプトにはページ本文（最大3万文字）が含まれるので、本文はログに出さずサイズとハッシュのみ出力
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Prompt: %d characters (sha256: %s)",
+                    len(prompt), hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+                )
 
             # HTTPリクエストを送信
-            response = requests.post(
+            response = self._session.post(
                 self.LAMBDA_URL,
-                json=payload,
+                data=orjson.dumps(payload),
                 headers=headers,  # ヘッダーを明示的に指定
                 timeout=self.TIMEOUT
             )
 
-            # レスポンスの詳細をログに出力
-            logger.debug(f"Response status code: {response.status_code}")
-            logger.debug(f"Response headers: {dict(response.headers)}")
-            logger.debug(f"Response body (first 500 chars): {response.text[:500]}")
+            # レスポンスの詳細をログに出力（response.text のデコードが重いので DEBUG 時のみ）
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response status code: %s", response.status_code)
+                logger.debug("Response headers: %s", dict(response.headers))
+                logger.debug("Response body (first 500 chars): %s", response.text[:500])
 
             # HTTPエラーをチェック
             response.raise_for_status()
 
             # レスポンスをパース
-            result = response.json()
-            logger.info(f"✅ Gemini response received")
+            result = orjson.loads(response.content)
+            logger.info("✅ Gemini response received")
 
             # レスポンスからテキストを抽出
             response_text = self._extract_response(result)
 
-            logger.debug(f"Response length: {len(response_text)} characters")
+            logger.debug("Response length: %d characters", len(response_text))
 
             return response_text
 
         except requests.exceptions.Timeout:
             error_msg = f"Gemini API request timed out after {self.TIMEOUT} seconds"
-            logger.error(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             raise Exception(error_msg)
 
         except requests.exceptions.RequestException as e:
             error_msg = f"Gemini API request failed: {str(e)}"
-            logger.error(f"❌ {error_msg}")
-            logger.error(f"Request URL: {self.LAMBDA_URL}")
-            logger.error(f"Request method: POST")
-            logger.error(f"Request headers: {headers if 'headers' in locals() else 'N/A'}")
+            logger.error("❌ %s", error_msg)
+            logger.error("Request URL: %s", self.LAMBDA_URL)
+            logger.error("Request method: POST")
+            logger.error("Request headers: %s", headers if 'headers' in locals() else 'N/A')
 
             # レスポンスが存在する場合は詳細を出力
             if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response status code: {e.response.status_code}")
-                logger.error(f"Response headers: {dict(e.response.headers)}")
-                logger.error(f"Response body: {e.response.text[:1000]}")  # 最初の1000文字
+                logger.error("Response status code: %s", e.response.status_code)
+                logger.error("Response headers: %s", dict(e.response.headers))
+                logger.error("Response body: %s", e.response.text[:1000])  # 最初の1000文字
             raise Exception(error_msg)
 
         except Exception as e:
             error_msg = f"Unexpected error in Gemini API call: {str(e)}"
-            logger.error(f"❌ {error_msg}", exc_info=True)
+            logger.error("❌ %s", error_msg, exc_info=True)
             raise Exception(error_msg)
 
     def _extract_response(self, result: Dict) -> str:
@@ -139,7 +157,7 @@ class GeminiClient:
         """
         try:
             # Lambda関数のレスポンス形式を確認
-            logger.debug(f"Response type: {type(result)}")
+            logger.debug("Response type: %s", type(result))
 
             # レスポンスが辞書型でbodyキーがある場合
             if isinstance(result, dict) and 'body' in result:
@@ -147,7 +165,7 @@ class GeminiClient:
 
                 # bodyが文字列の場合はJSONとしてパース
                 if isinstance(body, str):
-                    body = json.loads(body)
+                    body = orjson.loads(body)
 
                 # responseキーからテキストを取得
                 response_text = body.get('response', '')
@@ -163,17 +181,17 @@ class GeminiClient:
 
             # その他の形式の場合はエラー
             else:
-                logger.error(f"Unexpected response format: {result}")
+                logger.error("Unexpected response format: %s", result)
                 raise Exception(f"Unexpected response format from Lambda: {type(result)}")
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             error_msg = f"Failed to parse Lambda response JSON: {str(e)}"
-            logger.error(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             raise Exception(error_msg)
 
         except Exception as e:
             error_msg = f"Failed to extract response from Lambda result: {str(e)}"
-            logger.error(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             raise Exception(error_msg)
 
     def invoke_gemini_with_retry(
@@ -200,12 +218,12 @@ class GeminiClient:
 
         for attempt in range(max_retries):
             try:
-                logger.info(f"🔄 Attempt {attempt + 1}/{max_retries}")
+                logger.info("🔄 Attempt %d/%d", attempt + 1, max_retries)
                 return self.invoke_gemini(prompt, model)
 
             except Exception as e:
                 last_error = e
-                logger.warning(f"⚠️ Attempt {attempt + 1} failed: {str(e)}")
+                logger.warning("⚠️ Attempt %d failed: %s", attempt + 1, e)
 
                 # 最後の試行でない場合は少し待機
                 if attempt < max_retries - 1:
@@ -214,5 +232,20 @@ class GeminiClient:
 
         # すべてのリトライが失敗
         error_msg = f"All {max_retries} attempts failed. Last error: {str(last_error)}"
-        logger.error(f"❌ {error_msg}")
+        logger.error("❌ %s", error_msg)
         raise Exception(error_msg)
+
+
+@functools.lru_cache(maxsize=None)
+def get_gemini_client(secret_key: Optional[str] = None) -> GeminiClient:
+    """
+    プロセス内で共有する GeminiClient を取得
+    （リクエストごとに生成すると Lambda への接続プールが使い回されないため）
+
+    Args:
+        secret_key: Lambda Secret Key（環境変数 LAMBDA_SECRET_KEY から取得も可能）
+
+    Returns:
+        同じ secret_key に対しては常に同じ GeminiClient
+    """
+    return GeminiClient(secret_key)
@@ -0,0 +1,109 @@
+"""
+ページHTML・画像取得用の共有HTTPセッション
+同じURLへのリクエストはキャッシュ（SQLite）から返し、キャッシュミス時もコネクションを再利用する
+"""
+import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Tuple, Union
+
+# キャッシュの有効期限（秒）
+CACHE_EXPIRE_AFTER = 3600
+
+SESSION = requests_cache.CachedSession(
+    'cache.sqlite',
+    backend='sqlite',
+    expire_after=CACHE_EXPIRE_AFTER,
+    allowable_methods=['GET']
+)
+SESSION.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+})
+
+# 同一ホストへの並列リクエスト用にコネクションプールを拡張
+# 接続エラーや一時的な 5xx はここでリトライし、呼び出し元（Gemini 分析など）からのやり直しを避ける
+# （リトライ後もエラーの場合は呼び出し元の raise_for_status で検出する）
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=['GET', 'HEAD'],
+        raise_on_status=False
+    )
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+# 1ページあたりに読み込むHTMLの上限（バイト）
+MAX_HTML_BYTES = 2 * 1024 * 1024
+
+# ストリーミング時のチャンクサイズ（バイト）
+CHUNK_SIZE = 65536
+
+
+def get_html(
+    url: str,
+    timeout: Union[float, Tuple[float, float]] = 10,
+    max_bytes: int = MAX_HTML_BYTES,
+    session: Optional[requests.Session] = None
+) -> bytes:
+    """
+    ページのHTMLを取得（上限サイズに達した時点でダウンロードを打ち切る）
+
+    キャッシュ付きセッションはレスポンスを保存する際に本文をすべて読み込むため、
+    キャッシュ済みのページと Content-Length が上限以下のページのみキャッシュを使い、
+    それ以外（巨大なページ・サイズ不明のページ）はキャッシュを使わずにストリーミングで上限まで読み込む
+
+    Args:
+        url: 取得するページのURL
+        timeout: タイムアウト（秒、または (接続, 読み込み) のタプル）
+        max_bytes: 読み込む最大バイト数
+        session: 使用するセッション（省略時は共有セッション）
+
+    Returns:
+        HTMLのバイトデータ（最大 max_bytes まで）
+    """
+    session = session or SESSION
+
+    if isinstance(session, requests_cache.CachedSession):
+        if session.cache.contains(url=url) or _content_length(session, url, timeout) <= max_bytes:
+            response = session.get(url, timeout=timeout)
+            response.raise_for_status()
+            content = response.content
+            return content if len(content) <= max_bytes else content[:max_bytes]
+
+        with session.cache_disabled():
+            return _read_capped(session, url, timeout, max_bytes)
+
+    return _read_capped(session, url, timeout, max_bytes)
+
+
+def _content_length(session: requests.Session, url: str, timeout: Union[float, Tuple[float, float]]) -> float:
+    """HEAD リクエストで本文のサイズを取得（不明な場合は inf）"""
+    try:
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+        return int(response.headers['Content-Length']) if response.ok else float('inf')
+    except (requests.RequestException, KeyError, ValueError):
+        return float('inf')
+
+
+def _read_capped(
+    session: requests.Session,
+    url: str,
+    timeout: Union[float, Tuple[float, float]],
+    max_bytes: int
+) -> bytes:
+    """本文をストリーミングで読み込み、上限サイズに達した時点で打ち切る"""
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        buf = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            buf.extend(chunk)
+            if len(buf) >= max_bytes:
+                del buf[max_bytes:]
+                break
+    return bytes(buf)
@@ -1,4 +1,4 @@
-from PIL import Image
+from PIL import Image, ImageOps
 from io import BytesIO
 from typing import Tuple
 
@@ -32,9 +32,8 @@ class ImageProcessor:
         """
         img = Image.open(BytesIO(image_data))
 
-        # RGBA に変換（透明背景対応）
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
+        # 透過情報を持つ画像のみアルファ合成が必要（不透明な画像はRGBのまま処理）
+        needs_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
 
         # 目標のアスペクト比を計算
         target_ratio = target_aspect_ratio[0] / target_aspect_ratio[1]
@@ -52,19 +51,41 @@ class ImageProcessor:
             new_height = min(img.height, max_height)
             new_width = int(new_height * target_ratio)
 
-        # 元画像を目標サイズに収まるようにリサイズ（アスペクト比維持）
-        img.thumbnail((new_width, new_height), Image.Resampling.LANCZOS)
+        # JPEGの場合はデコード時に縮小（JPEG以外では何もしない）
+        # LANCZOS の品質を保つため目標サイズの2倍までに留める
+        img.draft('RGB', (new_width * 2, new_height * 2))
+
+        if needs_alpha:
+            # RGBA に変換（透明背景対応）
+            img = img.convert('RGBA')
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
 
-        # 新しいキャンバスを作成（黒背景）
-        canvas = Image.new('RGBA', (new_width, new_height), (0, 0, 0, 255))
+        # それでも目標の2倍以上ある画像（大きなPNGなど）はボックスフィルターで先に縮小
+        reduce_factor = min(img.width // (new_width * 2), img.height // (new_height * 2))
+        if reduce_factor >= 2:
+            img = img.reduce(reduce_factor)
 
-        # 元画像を中央に配置
-        paste_x = (new_width - img.width) // 2
-        paste_y = (new_height - img.height) // 2
-        canvas.paste(img, (paste_x, paste_y), img)
+        if needs_alpha:
+            # 元画像を目標サイズに収まるようにリサイズ（アスペクト比維持）
+            img.thumbnail((new_width, new_height), Image.Resampling.LANCZOS)
 
-        # RGB に変換（多くのAPIはRGBを要求）
-        canvas = canvas.convert('RGB')
+            # 新しいキャンバスを作成（黒背景、多くのAPIはRGBを要求）
+            canvas = Image.new('RGB', (new_width, new_height), (0, 0, 0))
+
+            # 元画像を中央に配置（アルファをマスクとして使用）
+            paste_x = (new_width - img.width) // 2
+            paste_y = (new_height - img.height) // 2
+            canvas.paste(img, (paste_x, paste_y), img)
+        else:
+            # リサイズ・黒背景でのパディング・中央配置を1回の処理で行う
+            canvas = ImageOps.pad(
+                img,
+                (new_width, new_height),
+                method=Image.Resampling.LANCZOS,
+                color=(0, 0, 0),
+                centering=(0.5, 0.5)
+            )
 
         # バイトデータに変換
         output = BytesIO()
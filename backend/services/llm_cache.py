@@ -0,0 +1,63 @@
+"""
+LLM のレスポンスキャッシュ
+キー: sha256(モデル名 + プロンプト)
+REDIS_URL が設定されている場合は Redis、未設定の場合はプロセス内メモリに保存する（KeyValueStore を使用）
+"""
+import hashlib
+import threading
+from typing import Dict, Optional
+
+from .store import KeyValueStore
+
+
+class LLMCache:
+    """同じモデル・プロンプトへの LLM 呼び出し結果をキャッシュするクラス"""
+
+    # デフォルトの有効期限（秒）
+    DEFAULT_TTL = 86400
+
+    # プロセス内メモリに保存する場合の最大件数
+    DEFAULT_MAX_ITEMS = 256
+
+    def __init__(
+        self,
+        ttl: int = DEFAULT_TTL,
+        max_items: int = DEFAULT_MAX_ITEMS,
+        redis_url: Optional[str] = None
+    ):
+        """
+        Args:
+            ttl: 有効期限（秒）
+            max_items: プロセス内メモリに保存する場合の最大件数（超えた場合は古いものから削除）
+            redis_url: Redis の接続URL（環境変数 REDIS_URL から取得も可能）
+        """
+        self._store = KeyValueStore('llm:', ttl=ttl, redis_url=redis_url, max_items=max_items)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        """キャッシュキーを生成"""
+        return hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        """キャッシュ済みのレスポンスを取得（存在しない場合は None）"""
+        cached = self._store.get(self.make_key(model, prompt))
+
+        with self._lock:
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return cached['response'] if cached else None
+
+    def set(self, model: str, prompt: str, response: str) -> None:
+        """レスポンスを保存"""
+        self._store.set(self.make_key(model, prompt), {'response': response})
+
+    def stats(self) -> Dict[str, int]:
+        """キャッシュのヒット数・ミス数を取得"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
@@ -2,22 +2,111 @@
 Gemini (Lambda経由) を使用してページを分析し、動画生成プロンプトを生成する
 """
 import os
+import re
+import logging
 import requests
+import string
 from bs4 import BeautifulSoup
 from typing import Dict, Optional
-from .gemini_client import GeminiClient
+from .gemini_client import GeminiClient, get_gemini_client
+from .http import SESSION, get_html
+from .llm_cache import LLMCache
+
+logger = logging.getLogger(__name__)
+
+# Gemini のレスポンスキャッシュ（キー: モデル名 + プロンプト）
+_llm_cache = LLMCache()
+
+# 連続する空白・改行を1つにまとめるためのパターン
+_WS = re.compile(r'\s+')
+
+# Gemini に渡す本文の最大文字数
+MAX_TEXT_CHARS = 30000
+
+# 本文がこの文字数未満の場合は分析しない（JSのみで描画されるページやエラーページ）
+MIN_TEXT_CHARS = 200
+
+# ボット対策ページ（Cloudflare のチャレンジ画面など）に含まれる文言
+_BLOCK_MARKERS = ('Just a moment', 'Checking your browser', 'captcha', 'CAPTCHA', 'Access denied')
+
+# 空白整理の前に切り詰める文字数（空白を詰めた後も MAX_TEXT_CHARS を確保できるよう余裕を持たせる）
+_MAX_RAW_TEXT_CHARS = MAX_TEXT_CHARS * 4
+
+# 動画生成プロンプトのテンプレート（import時に1回だけ読み込む）
+_PROMPTS_DIR = os.path.join(os.path.dirname(__file__), 'prompts')
+with open(os.path.join(_PROMPTS_DIR, 'video_ja.tmpl'), encoding='utf-8') as _f:
+    _VIDEO_PROMPT_TEMPLATE = string.Template(_f.read())
+
+# 1:1用の追加指示
+_SQUARE_INSTRUCTION = """
+【重要: 正方形描画指示】
+描画領域は1:1の正方形で、まず描画領域を定義し、上下を黒く塗りつぶして。描画領域にのみ描画して。テキスト、キャラクターが画面の中央に全て収まるようにして。
+"""
+
+# ページ分析の指示文（本文の前に付ける固定部分）
+# 固定部分をプロンプトの先頭に置くことで、Gemini 側の暗黙的なキャッシュが効きやすくなる
+_ANALYSIS_INSTRUCTION = """あなたは、指定されたWebページのコンテンツを分析し、P-MAX広告用の動画生成に必要な情報を抽出するAIアシスタントです。
+
+以下の7つの要素を抽出・推測してください：
+
+1. [商材/ブランド名]: h1タグ、titleタグ、またはロゴ周辺のテキストから最も適切な名称
+2. [メインターゲット]: 「〜な方へ」「〜にお悩みでは？」などの記述からターゲット層を推測
+3. [キャッチコピー]: ページのファーストビュー（FV）にある最も印象的で短いフレーズ
+4. [ベネフィット1]: 商材が提供する最も重要な利点や特徴の1つ目
+5. [ベネフィット2]: 商材が提供する2番目に重要な利点や特徴
+6. [オファー]: 「無料トライアル」「限定割引」「キャンペーン中」などの行動喚起フレーズ。見つからない場合は「特に指定なし」
+7. [CTAテキスト]: 「今すぐ購入」「資料請求」「無料で試す」など、ページ内の主要なボタンの文言
+
+以下の形式で回答してください：
+商材/ブランド名: [商材/ブランド名]
+メインターゲット: [メインターゲット]
+キャッチコピー: [キャッチコピー]
+ベネフィット1: [ベネフィット1]
+ベネフィット2: [ベネフィット2]
+オファー: [オファー]
+CTAテキスト: [CTAテキスト]
+
+【ウェブページの内容】
+"""
+
+# Geminiの回答のラベル → 商材情報のキー
+_ANALYSIS_FIELDS = {
+    '商材/ブランド名': 'product_name',
+    '商材／ブランド名': 'product_name',
+    '商材ブランド名': 'product_name',
+    '商材名': 'product_name',
+    'メインターゲット': 'target_audience',
+    'キャッチコピー': 'catchphrase',
+    'ベネフィット1': 'benefit1',
+    'ベネフィット2': 'benefit2',
+    'オファー': 'offer',
+}
+
+# 「CTAテキスト」「CTAボタン」など CTA で始まるラベルはすべて cta_text として扱う
+_CTA_FIELD = 'cta_text'
+
+# 「ラベル: 値」形式の行を抽出するパターン（行頭の箇条書き記号・番号・太字記号、全角コロンも許容）
+# 値が空の行で次の行を値として読まないよう、改行をまたがない [ \t] のみを空白として扱う
+_ANALYSIS_RE = re.compile(
+    r'^[ \t\-*・]*(?:\d+[.)．）][ \t]*)?[ \t*]*('
+    + '|'.join(map(re.escape, _ANALYSIS_FIELDS))
+    + r'|CTA[^:：\n]*?)[ \t*]*[:：][ \t]*(.*?)[ \t]*$',
+    re.MULTILINE
+)
 
 
 class PageAnalyzer:
     """Gemini (Lambda経由) を使用してページコンテンツを分析"""
 
-    def __init__(self, secret_key: Optional[str] = None):
+    def __init__(self, secret_key: Optional[str] = None, session: Optional[requests.Session] = None):
         """
         Args:
             secret_key: Lambda Secret Key（環境変数 LAMBDA_SECRET_KEY から取得も可能）
+            session: ページ取得に使用するセッション（省略時は ImageScraper 等と共有のセッション）
         """
         self.secret_key = secret_key or os.getenv('LAMBDA_SECRET_KEY')
-        self.gemini_client = GeminiClient(secret_key)
+        self.http = session or SESSION
+        self.gemini_client = get_gemini_client(self.secret_key)
 
     def analyze_page(self, url: str) -> Dict[str, str]:
         """
@@ -42,48 +131,33 @@ class PageAnalyzer:
 
         try:
             # ページのHTMLを取得
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            html = get_html(url, timeout=10, session=self.http)
+            soup = BeautifulSoup(html, 'lxml')
+
+            # キャラクター画像を抽出（取得済みのHTMLを使うのでページを再取得しない）
+            print("\n🖼️ キャラクター画像を抽出中...")
+            from .scraper import ImageScraper
+            images = ImageScraper(url, session=self.http).extract_images_from_soup(soup)
+            character_image_url = images.get('character_url', '')
+            print(f"✅ キャラクター画像URL: {character_image_url}")
 
             # 本文テキストを抽出（スクリプトとスタイルを除外）
             for script in soup(["script", "style"]):
                 script.decompose()
 
-            text_content = soup.get_text()
-            # 空白を整理
-            lines = (line.strip() for line in text_content.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text_content = ' '.join(chunk for chunk in chunks if chunk)
+            # 空白を整理し、テキストが長すぎる場合は制限
+            # （捨てる末尾まで正規表現をかけないよう先に大まかに切り詰める）
+            raw_text = soup.get_text(separator=' ')[:_MAX_RAW_TEXT_CHARS]
+            text_content = _WS.sub(' ', raw_text).strip()[:MAX_TEXT_CHARS]
 
-            # テキストが長すぎる場合は制限
-            if len(text_content) > 30000:
-                text_content = text_content[:30000]
+            # 分析できる本文がない場合は Gemini を呼ばずにエラーを返す
+            if len(text_content) < MIN_TEXT_CHARS:
+                if any(marker in text_content for marker in _BLOCK_MARKERS):
+                    return {'error': 'Page analysis failed: the page is protected by bot detection (captcha)'}
+                return {'error': 'Page analysis failed: insufficient text extracted from page'}
 
             # Gemini (Lambda経由) で分析
-            prompt = f"""あなたは、指定されたWebページのコンテンツを分析し、P-MAX広告用の動画生成に必要な情報を抽出するAIアシスタントです。
-
-以下の7つの要素を抽出・推測してください：
-
-1. [商材/ブランド名]: h1タグ、titleタグ、またはロゴ周辺のテキストから最も適切な名称
-2. [メインターゲット]: 「〜な方へ」「〜にお悩みでは？」などの記述からターゲット層を推測
-3. [キャッチコピー]: ページのファーストビュー（FV）にある最も印象的で短いフレーズ
-4. [ベネフィット1]: 商材が提供する最も重要な利点や特徴の1つ目
-5. [ベネフィット2]: 商材が提供する2番目に重要な利点や特徴
-6. [オファー]: 「無料トライアル」「限定割引」「キャンペーン中」などの行動喚起フレーズ。見つからない場合は「特に指定なし」
-7. [CTAテキスト]: 「今すぐ購入」「資料請求」「無料で試す」など、ページ内の主要なボタンの文言
-
-以下の形式で回答してください：
-商材/ブランド名: [商材/ブランド名]
-メインターゲット: [メインターゲット]
-キャッチコピー: [キャッチコピー]
-ベネフィット1: [ベネフィット1]
-ベネフィット2: [ベネフィット2]
-オファー: [オファー]
-CTAテキスト: [CTAテキスト]
-
-【ウェブページの内容】
-{text_content}"""
+            prompt = _ANALYSIS_INSTRUCTION + text_content
 
             analysis_text = self._invoke_gemini(prompt)
 
@@ -93,14 +167,6 @@ CTAテキスト: [CTAテキスト]
             # プロンプトを生成
             generated_prompt = self._generate_video_prompt(product_info)
 
-            # キャラクター画像を抽出
-            print("\n🖼️ キャラクター画像を抽出中...")
-            from .scraper import ImageScraper
-            scraper = ImageScraper(url)
-            images = scraper.extract_images()
-            character_image_url = images.get('character_url', '')
-            print(f"✅ キャラクター画像URL: {character_image_url}")
-
             return {
                 'product_name': product_info.get('product_name', ''),
                 'target_audience': product_info.get('target_audience', ''),
@@ -118,30 +184,31 @@ CTAテキスト: [CTAテキスト]
         except Exception as e:
             return {'error': f'Page analysis failed: {str(e)}'}
 
-    def _parse_analysis(self, analysis_text: str) -> Dict[str, str]:
-        """Geminiの分析結果をパースする"""
-        result = {}
-
-        lines = analysis_text.split('\n')
-        for line in lines:
-            if '商材/ブランド名' in line or '商材名' in line:
-                result['product_name'] = line.split(':', 1)[1].strip() if ':' in line else ''
-            elif 'メインターゲット' in line:
-                result['target_audience'] = line.split(':', 1)[1].strip() if ':' in line else ''
-            elif 'キャッチコピー' in line:
-                result['catchphrase'] = line.split(':', 1)[1].strip() if ':' in line else ''
-            elif 'ベネフィット1' in line:
-                result['benefit1'] = line.split(':', 1)[1].strip() if ':' in line else ''
-            elif 'ベネフィット2' in line:
-                result['benefit2'] = line.split(':', 1)[1].strip() if ':' in line else ''
-            elif 'オファー' in line:
-                result['offer'] = line.split(':', 1)[1].strip() if ':' in line else ''
-            elif 'CTAテキスト' in line or 'CTA' in line:
-                result['cta_text'] = line.split(':', 1)[1].strip() if ':' in line else ''
-
-        return result
-
-    def _generate_video_prompt(self, product_info: Dict[str, str], aspect_ratio: str = "16:9") -> str:
+    @staticmethod
+    def _parse_analysis(analysis_text: str) -> Dict[str, str]:
+        """
+        Geminiの分析結果をパースする
+
+        >>> PageAnalyzer._parse_analysis('商材名：テスト商品')
+        {'product_name': 'テスト商品'}
+        >>> PageAnalyzer._parse_analysis('- **メインターゲット**: 30代女性\\n・オファー: 初回無料')
+        {'target_audience': '30代女性', 'offer': '初回無料'}
+        >>> PageAnalyzer._parse_analysis('1. キャッチコピー: 毎日を軽やかに\\n2) 商材/ブランド名: テスト')
+        {'catchphrase': '毎日を軽やかに', 'product_name': 'テスト'}
+        >>> PageAnalyzer._parse_analysis('オファー:\\nCTAテキスト: 今すぐ購入')
+        {'offer': '', 'cta_text': '今すぐ購入'}
+        >>> PageAnalyzer._parse_analysis('CTAボタン: 無料で試す')
+        {'cta_text': '無料で試す'}
+        >>> PageAnalyzer._parse_analysis('**CTAテキスト**: 資料請求')
+        {'cta_text': '資料請求'}
+        """
+        return {
+            _ANALYSIS_FIELDS.get(match.group(1), _CTA_FIELD): match.group(2)
+            for match in _ANALYSIS_RE.finditer(analysis_text)
+        }
+
+    @staticmethod
+    def _generate_video_prompt(product_info: Dict[str, str], aspect_ratio: str = "16:9") -> str:
         """
         商材情報を基に動画生成プロンプトを生成
 
@@ -152,114 +219,24 @@ CTAテキスト: [CTAテキスト]
         Returns:
             動画生成用のプロンプト
         """
-        product_name = product_info.get('product_name', '[商材/ブランド名]')
-        target = product_info.get('target_audience', '[メインターゲット]')
-        catchphrase = product_info.get('catchphrase', '[キャッチコピー]')
-        benefit1 = product_info.get('benefit1', '[ベネフィット1]')
-        benefit2 = product_info.get('benefit2', '[ベネフィット2]')
-        offer = product_info.get('offer', '[オファー]')
-        cta_text = product_info.get('cta_text', '[CTAテキスト]')
-
-        # 1:1用の追加指示
-        square_instruction = ""
-        if aspect_ratio == "1:1":
-            square_instruction = """
-【重要: 正方形描画指示】
-描画領域は1:1の正方形で、まず描画領域を定義し、上下を黒く塗りつぶして。描画領域にのみ描画して。テキスト、キャラクターが画面の中央に全て収まるようにして。
-"""
-
-        prompt = f"""汎用P-MAX広告動画 生成プロンプト（12秒・キャラクター画像1点入力）
-【目的】 Google P-MAX広告枠（YouTube Shorts, Discover等）向けに、無音再生でもターゲットの注意を引き、行動を喚起する12秒の動画を生成する。
-
-【提供アセット（必須）】
-
-キャラクター画像（背景透過推奨）
-{square_instruction}
-【ユーザー入力（URL分析結果）】
-
-[商材/ブランド名]：{product_name}
-
-[メインターゲット]：{target}
-
-[キャッチコピー]：{catchphrase}
-
-[ベネフィット1]：{benefit1}
-
-[ベネフィット2]：{benefit2}
-
-[オファー（任意）]：{offer}
-
-[CTAテキスト]：{cta_text}
-
-【AIへの動画生成シーケンス指示】
-
-全体のトーン＆マナー: モダン、スピーディー、信頼感。BGMはアップテンポなインストルメンタルのみで、音声・ナレーション・テキスト読み上げは一切含めないこと。
-
-テキスト表示の重要な注意事項:
-- すべてのテキスト（テロップ）は、太字の明瞭なゴシック体フォントを使用すること
-- テキストは完全に読みやすく、クリアにレンダリングすること
-- 文字が歪んだり、崩れたり、不鮮明になることは絶対に避けること
-- テキストと背景の間に強いコントラストを持たせ、常に読みやすい状態を保つこと
-
-▼ シーケンス 1：掴み (0-3秒)
-
-映像:
-
-提供されたキャラクター画像を入力画像として使用する。
-
-このキャラクターに、{target} に向かって手を振ったり、元気にジャンプして登場するようなアニメーション（動き）をつける。
-
-背景はブランドカラーをベースにした明るくダイナミックな抽象アニメーション。
-
-テロップ (特大): {catchphrase}
-
-▼ シーケンス 2：ベネフィット 1 (4-6秒)
-
-映像:
-
-キャラクターは画面の隅（例：左下）に移動し、案内役として頷いたり、指をさしたりするリアクションをとる。
-
-画面中央に {benefit1} を象徴するシンプルなアイコン（例：歯車、チェックマーク、書類アイコン）がポップアップ表示される。
-
-テロップ (大・中央): {benefit1}
-
-▼ シーケンス 3：ベネフィット 2 / オファー (7-9秒)
-
-映像:
-
-中央のアイコンとテキストが、{benefit2} または {offer} の内容に素早く切り替わる。（例：グラフアイコン、カレンダーアイコン）
-
-キャラクターは驚きや喜びの表情のアニメーションをとる。
-
-テロップ (大・中央): {benefit2} または {offer}
-
-▼ シーケンス 4：CTAとブランド提示 (10-12秒)
-
-映像:
-
-画面全体が白またはブランドカラーのクリーンな背景に切り替わる。（キャラクターはここで消えても良い）
-
-中央にテキストで {product_name} をロゴのように大きく表示する。（フォントは太く、信頼感のあるもの）
-
-その下に、行動喚起のボタン風デザインを配置する。
-
-テロップ (ボタン内・特大): {cta_text}
-
-テロップ (画面下部・小): {product_name} で検索
-
-共通事項:
-- すべてのテキストは最前面に配置し、背景と十分なコントラストを持たせること。
-- テキストは完全に読みやすく、文字が崩れない鮮明な表示を維持すること。
-- テキストのフォントサイズは十分に大きく、太字で明瞭にすること。
-- 音声・ナレーション・テキスト読み上げは一切使用せず、BGMのみとすること。
-"""
-
-        return prompt
+        # 1:1の場合のみ正方形描画指示を埋め込む
+        square_instruction = _SQUARE_INSTRUCTION if aspect_ratio == "1:1" else ""
+
+        return _VIDEO_PROMPT_TEMPLATE.substitute(
+            product_name=product_info.get('product_name', '[商材/ブランド名]'),
+            target=product_info.get('target_audience', '[メインターゲット]'),
+            catchphrase=product_info.get('catchphrase', '[キャッチコピー]'),
+            benefit1=product_info.get('benefit1', '[ベネフィット1]'),
+            benefit2=product_info.get('benefit2', '[ベネフィット2]'),
+            offer=product_info.get('offer', '[オファー]'),
+            cta_text=product_info.get('cta_text', '[CTAテキスト]'),
+            square_instruction=square_instruction
+        )
 
     def _invoke_gemini(self, prompt: str, model: Optional[str] = None) -> str:
         """
         Lambda経由でGeminiを呼び出してレスポンスを取得
-        （GeminiClientクラスを使用）
+        （GeminiClientクラスを使用、同じプロンプトはキャッシュから返す）
 
         Args:
             prompt: 分析プロンプト
@@ -268,4 +245,13 @@ CTAテキスト: [CTAテキスト]
         Returns:
             Geminiのレスポンステキスト
         """
-        return self.gemini_client.invoke_gemini(prompt, model)
+        model = model or GeminiClient.DEFAULT_MODEL
+
+        cached = _llm_cache.get(model, prompt)
+        if cached is not None:
+            logger.debug("💾 LLM cache hit: %s", _llm_cache.stats())
+            return cached
+
+        response_text = self.gemini_client.invoke_gemini(prompt, model)
+        _llm_cache.set(model, prompt, response_text)
+        return response_text
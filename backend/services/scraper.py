@@ -1,18 +1,41 @@
+import logging
 import requests
-from bs4 import BeautifulSoup
+import soupsieve as sv
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import Dict, Optional
 import re
 from urllib.parse import urljoin
+from .http import SESSION, get_html
+
+logger = logging.getLogger(__name__)
+
+# ヘッダーロゴ画像のセレクター
+_LOGO_SEL = sv.compile(
+    '.wonder-header .wonder-header-inner .wonder-header-logo-wrapper .wonder-header-main .wonder-header-logo img'
+)
+
+# キャラクター画像のセレクター（元の構造で見つからない場合はクラス名のみで探す）
+_CHARACTER_SEL = sv.compile('.wonder-cv .wonder-cv-wrapper .wonder-cv-back-person-img')
+_CHARACTER_FALLBACK_SEL = sv.compile('.wonder-cv-back-person-img')
+
+# パース対象を wonder-header / wonder-cv 配下の要素に絞る（子孫はそのまま残るのでセレクターは変更不要）
+_STRAINER = SoupStrainer(class_=lambda c: c is not None and ('wonder-header' in c or 'wonder-cv' in c))
+
+# style 属性の background-image から URL を取り出すパターン
+_BG_URL_RE = re.compile(r'url\(["\']?([^"\']+)["\']?\)')
+
 
 class ImageScraper:
     """指定されたURLから特定のCSSセレクタで画像を抽出するクラス"""
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, session: Optional[requests.Session] = None):
+        """
+        Args:
+            url: 画像を抽出するページのURL
+            session: 使用するセッション（省略時は PageAnalyzer 等と共有のセッション）
+        """
         self.url = url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.session = session or SESSION
 
     def extract_images(self) -> Dict[str, Optional[str]]:
         """
@@ -24,24 +47,35 @@ class ImageScraper:
             }
         """
         try:
-            response = self.session.get(self.url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # 巨大なページでもメモリを使い切らないよう上限サイズまでに制限して取得
+            html = get_html(self.url, timeout=10, session=self.session)
+            soup = BeautifulSoup(html, 'lxml', parse_only=_STRAINER)
 
-            logo_url = self._extract_logo(soup)
-            character_url = self._extract_character(soup)
-
-            return {
-                'logo_url': logo_url,
-                'character_url': character_url
-            }
+            return self.extract_images_from_soup(soup)
         except Exception as e:
             raise Exception(f"Failed to fetch page: {str(e)}")
 
+    def extract_images_from_soup(self, soup: BeautifulSoup) -> Dict[str, Optional[str]]:
+        """
+        取得済みのHTMLから画像URLを抽出（ページを再取得しない）
+
+        Args:
+            soup: self.url のページをパースした BeautifulSoup
+
+        Returns:
+            {
+                'logo_url': str or None,
+                'character_url': str or None
+            }
+        """
+        return {
+            'logo_url': self._extract_logo(soup),
+            'character_url': self._extract_character(soup)
+        }
+
     def _extract_logo(self, soup: BeautifulSoup) -> Optional[str]:
         """ヘッダーロゴ画像のURLを抽出"""
-        selector = '.wonder-header .wonder-header-inner .wonder-header-logo-wrapper .wonder-header-main .wonder-header-logo img'
-        img_element = soup.select_one(selector)
+        img_element = _LOGO_SEL.select_one(soup)
 
         if img_element and img_element.get('src'):
             return urljoin(self.url, img_element['src'])
@@ -49,58 +83,28 @@ class ImageScraper:
 
     def _extract_character(self, soup: BeautifulSoup) -> Optional[str]:
         """キャラクター画像のURLを抽出"""
-        # 複数のセレクターパターンを試す
-        selectors = [
-            '.wonder-cv .wonder-cv-wrapper .wonder-cv-back-person-img',  # 元のセレクター
-            '.wonder-cv-back-person-img',  # クラス名のみ
-            'img.wonder-cv-back-person-img',  # imgタグに限定
-        ]
-
-        element = None
-        matched_selector = None
-        for selector in selectors:
-            print(f"🔍 セレクター試行: {selector}")
-            element = soup.select_one(selector)
-            if element:
-                matched_selector = selector
-                print(f"✅ マッチしました: {selector}")
-                print(f"   要素タグ: {element.name}")
-                print(f"   クラス: {element.get('class', [])}")
-                break
-            else:
-                print(f"❌ マッチせず: {selector}")
+        element = _CHARACTER_SEL.select_one(soup) or _CHARACTER_FALLBACK_SEL.select_one(soup)
 
         if not element:
-            print("❌ すべてのセレクターでマッチせず")
-            # デバッグ: wonder-cv-back-person-img を含むすべての要素を検索
-            all_matches = soup.find_all(class_=lambda x: x and 'wonder-cv-back-person-img' in x)
-            print(f"🔍 'wonder-cv-back-person-img' を含む要素数: {len(all_matches)}")
-            for idx, el in enumerate(all_matches[:3]):  # 最初の3つだけ表示
-                print(f"   [{idx}] タグ: {el.name}, クラス: {el.get('class', [])}, src: {el.get('src', 'なし')[:50]}")
+            logger.debug("❌ キャラクター画像の要素が見つかりません: %s", self.url)
             return None
 
         # 要素自体が img タグの場合（最優先）
         if element.name == 'img' and element.get('src'):
-            src = element.get('src')
-            print(f"✅ imgタグのsrc属性から取得: {src[:100]}")
-            return urljoin(self.url, src)
+            return urljoin(self.url, element['src'])
 
         # background-image から URL を抽出
         style = element.get('style', '')
-        match = re.search(r'url\(["\']?([^"\']+)["\']?\)', style)
+        match = _BG_URL_RE.search(style)
         if match:
-            url = match.group(1)
-            print(f"✅ background-imageから取得: {url[:100]}")
-            return urljoin(self.url, url)
+            return urljoin(self.url, match.group(1))
 
         # または子要素の img タグを探す
         img_element = element.find('img')
         if img_element and img_element.get('src'):
-            src = img_element.get('src')
-            print(f"✅ 子要素のimgタグから取得: {src[:100]}")
-            return urljoin(self.url, src)
+            return urljoin(self.url, img_element['src'])
 
-        print("❌ 画像URLを抽出できませんでした")
+        logger.debug("❌ 画像URLを抽出できませんでした: %s", self.url)
         return None
 
     def download_image(self, image_url: str) -> bytes:
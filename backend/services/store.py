@@ -0,0 +1,92 @@
+"""
+TTL付きのキー・バリューストア
+REDIS_URL が設定されている場合は Redis、未設定の場合はプロセス内メモリに保存する
+"""
+import os
+import json
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class KeyValueStore:
+    """プレフィックス付きのキーでJSON値を保存するストア"""
+
+    # デフォルトの有効期限（秒）
+    DEFAULT_TTL = 86400
+
+    # プロセス内メモリに保存する場合の最大件数（超えた場合は古いものから削除）
+    DEFAULT_MAX_ITEMS = 10000
+
+    def __init__(
+        self,
+        prefix: str,
+        ttl: int = DEFAULT_TTL,
+        redis_url: Optional[str] = None,
+        max_items: int = DEFAULT_MAX_ITEMS
+    ):
+        """
+        Args:
+            prefix: キーのプレフィックス（例: 'job:'）
+            ttl: 有効期限（秒）
+            redis_url: Redis の接続URL（環境変数 REDIS_URL から取得も可能）
+            max_items: プロセス内メモリに保存する場合の最大件数
+        """
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_items = max_items
+        self._redis = None
+        self._items: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.RLock()
+
+        redis_url = redis_url or os.getenv('REDIS_URL')
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """値を取得（存在しない・期限切れの場合は None）"""
+        if self._redis is not None:
+            raw = self._redis.get(self.prefix + key)
+            return json.loads(raw) if raw else None
+
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, raw = item
+            if expires_at < time.time():
+                del self._items[key]
+                return None
+            return json.loads(raw)
+
+    def set(self, key: str, value: Dict) -> None:
+        """値を保存"""
+        raw = json.dumps(value, ensure_ascii=False)
+        if self._redis is not None:
+            self._redis.setex(self.prefix + key, self.ttl, raw)
+            return
+
+        with self._lock:
+            now = time.time()
+            # 有効期限はすべて同じ ttl なので、保存し直したキーを末尾に移せば先頭ほど期限が近い順になる
+            self._items.pop(key, None)
+            self._items[key] = (now + self.ttl, raw)
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """期限切れの値と最大件数を超えた古い値を削除（再び読まれないキーが溜まり続けないようにする）"""
+        while self._items:
+            oldest_key = next(iter(self._items))
+            expires_at, _ = self._items[oldest_key]
+            if expires_at >= now and len(self._items) <= self.max_items:
+                break
+            del self._items[oldest_key]
+
+    def update(self, key: str, **fields) -> Dict:
+        """既存の値にフィールドをマージして保存"""
+        with self._lock:
+            value = self.get(key) or {}
+            value.update(fields)
+            self.set(key, value)
+            return value
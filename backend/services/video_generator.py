@@ -1,33 +1,182 @@
 import fal_client
 import os
+import re
+import random
+import shutil
+import hashlib
+import functools
+import threading
+import httpx
 import requests
 import logging
-from typing import Dict, Optional
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import BinaryIO, Dict, Iterator, List, Optional
 from io import BytesIO
 from .exceptions import ContentPolicyViolationError, VideoGenerationError
+from .store import KeyValueStore
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
 logger = logging.getLogger(__name__)
 
+# アップロード済み画像のURLキャッシュ（キー: 画像データのハッシュ）
+# アップロードしたファイルが fal-ai 側で期限切れになる前に破棄するため短めにする
+UPLOAD_CACHE_TTL = 3600
+_upload_cache = KeyValueStore('upload:', ttl=UPLOAD_CACHE_TTL)
+
+# 動画ダウンロード用の共有セッション（fal-ai の CDN への接続を使い回す）
+# 動画本体をキャッシュしないよう、ページ取得用のキャッシュ付きセッションとは分ける
+_DOWNLOAD_SESSION = requests.Session()
+_download_adapter = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504], raise_on_status=False)
+)
+_DOWNLOAD_SESSION.mount('https://', _download_adapter)
+_DOWNLOAD_SESSION.mount('http://', _download_adapter)
+
+# 動画ダウンロードのタイムアウト（接続, 読み込み）秒
+DOWNLOAD_TIMEOUT = (5, 60)
+
+
+@functools.lru_cache(maxsize=1)
+def _ffmpeg_exe() -> str:
+    """ffmpeg の実行ファイルのパスを取得（PATH になければ imageio-ffmpeg が同梱するものを使う）"""
+    path = shutil.which('ffmpeg')
+    if path:
+        return path
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+# コンテンツポリシー違反のエラーメッセージを判定するパターン
+_POLICY_RE = re.compile(
+    r'content.*policy|policy[_ ]violation|nsfw|not safe for work|inappropriate content|safety (?:filter|system)',
+    re.IGNORECASE | re.DOTALL
+)
+
+# 送信前に拒否するプロンプトの語句（fal-ai で確実に拒否されるもののみ）
+# 「ヌードベージュ」「アダルトニキビ」など化粧品LPで普通に使われる語は商材情報からプロンプトに入るため含めない
+_PROMPT_BADWORDS = re.compile(
+    r'\b(?:nsfw|porn\w*|hentai)\b|ポルノ',
+    re.IGNORECASE
+)
+
+# コンテンツポリシー違反で拒否された（画像, プロンプト）の組み合わせ
+POLICY_REJECTION_TTL = 86400
+_policy_rejections = KeyValueStore('policy:', ttl=POLICY_REJECTION_TTL)
+
+# キューに投入したジョブの入力（キー: fal-ai のリクエストID）
+# 完了を待つプロセス・webhook を受け取るプロセスでも拒否された組み合わせを記録できるようにする
+_submitted_inputs = KeyValueStore('submitted:', ttl=POLICY_REJECTION_TTL)
+
+
+def _is_transient_error(error: Exception) -> bool:
+    """再送すれば成功する可能性のあるエラー（fal-ai の 5xx・接続エラー・タイムアウト）かどうか"""
+    # fal_client は HTTP エラーを FalClientError に変換するので、元の例外（__cause__）も確認する
+    cause = error.__cause__ or error
+    status_code = getattr(getattr(cause, 'response', None), 'status_code', None)
+    if status_code is not None:
+        return 500 <= status_code < 600
+    return isinstance(cause, (httpx.TransportError, requests.ConnectionError, requests.Timeout))
+
+
+def _rejection_key(image_data: bytes, prompt: str) -> str:
+    """拒否された組み合わせを記録するキーを生成"""
+    return (
+        hashlib.sha256(image_data).hexdigest() + ':'
+        + hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    )
+
+
+# コンテンツポリシー違反時のエラーメッセージ
+_POLICY_VIOLATION_MESSAGE = (
+    "以下の理由が考えられます:\n"
+    "・画像に不適切なコンテンツが含まれている可能性\n"
+    "・プロンプトに不適切な表現が含まれている可能性\n"
+    "・人物画像の場合、服装や背景が原因の可能性\n\n"
+    "対処方法:\n"
+    "・より一般的な画像を使用してください\n"
+    "・別のキャラクター画像をお試しください\n"
+    "・プロンプト内容を確認してください"
+)
+
+# H.264 エンコーダーの優先順位と設定（ハードウェアエンコーダー → libx264）
+_H264_ENCODERS = [
+    ('h264_videotoolbox', ['-c:v', 'h264_videotoolbox', '-b:v', '6M']),
+    ('h264_nvenc', ['-c:v', 'h264_nvenc', '-preset', 'p4', '-b:v', '6M']),
+    ('libx264', ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18']),
+]
+
+# 同時に実行する ffmpeg の最大数（プロセス全体で共有）
+# ffmpeg の実行数だけを制限するもので、生成・ダウンロードと後処理の間にキューを挟むパイプラインではない
+# （ダウンロードは制限しないので、バッチ生成で動画の数より少ない場合は ffmpeg の実行を待つことになる）
+MAX_CONCURRENT_POSTPROCESS = 2
+_postprocess_slots = threading.BoundedSemaphore(MAX_CONCURRENT_POSTPROCESS)
+
+# 実行に失敗したハードウェアエンコーダー
+_UNUSABLE_ENCODERS = set()
+
+
+@functools.lru_cache(maxsize=1)
+def _available_encoders() -> str:
+    """ffmpeg のビルドに含まれるエンコーダーの一覧を取得"""
+    import subprocess
+    result = subprocess.run([_ffmpeg_exe(), '-hide_banner', '-encoders'], capture_output=True, text=True)
+    return result.stdout
+
+
+def _h264_encoders():
+    """使用する H.264 エンコーダーの候補を優先順に返す（libx264 は常に最後に含む）"""
+    available = _available_encoders()
+    return [
+        (name, encoder_args) for name, encoder_args in _H264_ENCODERS
+        if name == 'libx264' or (name in available and name not in _UNUSABLE_ENCODERS)
+    ]
+
+
 class VideoGenerator:
     """fal-ai を使用して画像から動画を生成するクラス"""
 
-    def __init__(self, fal_key: Optional[str] = None):
+    # 使用するモデル
+    MODEL_NAME = "fal-ai/sora-2/image-to-video/pro"
+
+    # ジョブのステータス確認の間隔（秒）
+    POLL_INITIAL_INTERVAL = 0.5
+    POLL_MAX_INTERVAL = 3.0
+
+    # ジョブの完了を待つ最大時間（秒、環境変数 FAL_POLL_TIMEOUT で変更可能）
+    # 超えた場合はジョブをキャンセルしてエラーにする（応答のないジョブでスレッドを占有し続けない）
+    POLL_TIMEOUT = float(os.getenv('FAL_POLL_TIMEOUT', '1200'))
+
+    # 一時的なエラー時のリトライ間隔の上限（秒）
+    RETRY_MAX_DELAY = 30
+
+    # キャラクター動画のデフォルトプロンプト
+    DEFAULT_CHARACTER_PROMPT = "Make this character dance with lively and fun movements. Add energetic body language and natural motion."
+
+    def __init__(self, fal_key: Optional[str] = None, session: Optional[requests.Session] = None):
         """
         Args:
             fal_key: fal.ai API キー（環境変数 FAL_KEY から取得も可能）
+            session: 動画ダウンロードに使用するセッション（省略時はプロセス内で共有のセッション）
         """
         # FAL_KEY を環境変数に設定（fal_client が自動的に使用）
         if fal_key:
             os.environ['FAL_KEY'] = fal_key
+
+        self._session = session or _DOWNLOAD_SESSION
+
     def generate_video_from_image(
         self,
         image_data: bytes,
         prompt: str,
         duration: int = 4,
         aspect_ratio: str = "16:9",
-        max_retries: int = 1
+        max_retries: int = 3,
+        jitter_base: float = 0.5
     ) -> Dict[str, any]:
         """
         画像から動画を生成 (Sora 2使用)
@@ -37,7 +186,9 @@ class VideoGenerator:
             prompt: 動画生成のプロンプト（必須）
             duration: 動画の長さ（4, 8, または 12秒）
             aspect_ratio: アスペクト比（"16:9" または "9:16"）
-            max_retries: コンテンツポリシー違反時の最大リトライ回数（デフォルト: 1）
+            max_retries: 一時的なエラー（fal-ai の 5xx・接続エラー）時の最大試行回数（デフォルト: 3）
+                         コンテンツポリシー違反は同じ入力で再送しても結果が変わらないためリトライしない
+            jitter_base: リトライ前の待ち時間に加えるランダムな揺らぎの最大値（秒）
 
         Returns:
             {
@@ -45,6 +196,8 @@ class VideoGenerator:
                 'status': str
             }
         """
+        rejection_key = self._check_policy(image_data, prompt)
+
         # 画像を1回だけアップロード（リトライ時に再利用）
         image_url = self._upload_image(image_data)
 
@@ -53,14 +206,14 @@ class VideoGenerator:
             try:
                 # fal-ai/sora-2/image-to-video を呼び出し
                 # FAL_KEY は環境変数から fal_client が自動的に読み込む
-                model_name = "fal-ai/sora-2/image-to-video/pro"
+                model_name = self.MODEL_NAME
 
                 if attempt > 0:
-                    print(f"🔄 リトライ {attempt}/{max_retries - 1} 回目...")
+                    logger.info("🔄 リトライ %d/%d 回目...", attempt, max_retries - 1)
                 else:
-                    print(f"🎯 使用モデル: {model_name}")
+                    logger.info("🎯 使用モデル: %s", model_name)
 
-                result = fal_client.subscribe(
+                handle = fal_client.submit(
                     model_name,
                     arguments={
                         "image_url": image_url,
@@ -68,20 +221,20 @@ class VideoGenerator:
                         "duration": duration,
                         "resolution": "auto",
                         "aspect_ratio": aspect_ratio
-                    },
-                    with_logs=True
+                    }
                 )
+                result = self._wait_for_result(handle)
 
-                print(f"✅ fal-ai result: {result}")
+                logger.debug("✅ fal-ai result: %s", result)
 
                 # 結果から動画URLを取得
-                video_url = result.get('video', {}).get('url')
+                video_url = self._extract_video_url(result)
 
                 if not video_url:
-                    raise Exception(f"Video URL not found in response. Full response: {result}")
+                    raise Exception("Video URL not found in response")
 
                 if attempt > 0:
-                    print(f"✅ リトライ成功！（{attempt + 1}回目の試行で成功）")
+                    logger.info("✅ リトライ成功！（%d回目の試行で成功）", attempt + 1)
 
                 return {
                     'video_url': video_url,
@@ -96,34 +249,297 @@ class VideoGenerator:
 
                 # エラータイプ別にハンドリング
                 if error_type == 'content_policy_violation':
-                    logger.error(f"❌ Content policy violation detected (attempt {attempt + 1}/{max_retries}): {error_msg}")
-
-                    # 最後の試行でもエラーの場合は例外を投げる
-                    if attempt == max_retries - 1:
-                        logger.error(f"❌ {max_retries}回のリトライ後もコンテンツポリシー違反エラーが継続")
-                        raise ContentPolicyViolationError(
-                            f"動画生成がコンテンツポリシー違反により拒否されました（{max_retries}回試行）。\n"
-                            "以下の理由が考えられます:\n"
-                            "・画像に不適切なコンテンツが含まれている可能性\n"
-                            "・プロンプトに不適切な表現が含まれている可能性\n"
-                            "・人物画像の場合、服装や背景が原因の可能性\n\n"
-                            "対処方法:\n"
-                            "・より一般的な画像を使用してください\n"
-                            "・別のキャラクター画像をお試しください\n"
-                            "・プロンプト内容を確認してください"
-                        )
-
-                    # まだリトライ可能な場合は次のループへ
-                    print(f"⚠️ コンテンツポリシー違反を検出。リトライします... ({attempt + 1}/{max_retries})")
+                    logger.error("❌ Content policy violation detected: %s", error_msg)
+                    _policy_rejections.set(rejection_key, {'error': error_msg})
+                    raise ContentPolicyViolationError(
+                        "動画生成がコンテンツポリシー違反により拒否されました。\n"
+                        + _POLICY_VIOLATION_MESSAGE
+                    )
+
+                # 一時的なエラーは待ってから次のループへ
+                # （直後に再送すると fal-ai に負荷をかけるだけなので指数的に間隔を空け、揺らぎを加える）
+                if _is_transient_error(e) and attempt < max_retries - 1:
+                    delay = min(self.RETRY_MAX_DELAY, 2 ** attempt) + random.uniform(0, jitter_base)
+                    logger.warning(
+                        "⚠️ 一時的なエラーを検出。%.1f秒後にリトライします... (%d/%d): %s",
+                        delay, attempt + 1, max_retries, error_msg
+                    )
+                    time.sleep(delay)
                     continue
 
                 # その他のエラー（リトライしない）
-                logger.error(f"❌ Video generation failed: {error_msg}")
+                logger.error("❌ Video generation failed: %s", error_msg)
                 raise VideoGenerationError(f"動画生成に失敗しました: {error_msg}")
 
         # ここには到達しないはずだが、念のため
         raise VideoGenerationError("予期しないエラー: リトライループが完了しましたが結果がありません")
 
+    def submit_character_video(
+        self,
+        image_data: bytes,
+        prompt: Optional[str] = None,
+        aspect_ratio: str = "16:9",
+        webhook_url: Optional[str] = None
+    ) -> str:
+        """
+        キャラクター動画の生成ジョブを fal-ai のキューに投入（完了を待たない）
+
+        Args:
+            image_data: キャラクター画像のバイトデータ
+            prompt: カスタムプロンプト（未指定の場合はデフォルト使用）
+            aspect_ratio: アスペクト比（"16:9" または "9:16"）
+            webhook_url: 生成完了時に fal-ai が結果をPOSTするURL
+
+        Returns:
+            fal-ai のリクエストID
+        """
+        handle = self.submit_video(
+            image_data,
+            prompt=prompt or self.DEFAULT_CHARACTER_PROMPT,
+            duration=12,
+            aspect_ratio=aspect_ratio,
+            webhook_url=webhook_url
+        )
+        return handle.request_id
+
+    def submit_video(
+        self,
+        image_data: bytes,
+        prompt: str,
+        duration: int = 4,
+        aspect_ratio: str = "16:9",
+        webhook_url: Optional[str] = None
+    ) -> fal_client.SyncRequestHandle:
+        """
+        動画生成ジョブを fal-ai のキューに投入（完了を待たない）
+        複数の動画を生成する場合は、先にすべて投入してから await_video で待つと並行して生成される
+
+        Args:
+            image_data: 入力画像のバイトデータ
+            prompt: 動画生成のプロンプト
+            duration: 動画の長さ（4, 8, または 12秒）
+            aspect_ratio: アスペクト比（"16:9" または "9:16"）
+            webhook_url: 生成完了時に fal-ai が結果をPOSTするURL
+
+        Returns:
+            fal-ai のリクエストハンドル
+
+        Raises:
+            ContentPolicyViolationError: 投入前にコンテンツポリシー違反と判定された場合
+        """
+        rejection_key = self._check_policy(image_data, prompt)
+
+        image_url = self._upload_image(image_data)
+
+        # webhook を使わない場合は引数自体を渡さない
+        submit_kwargs = {'webhook_url': webhook_url} if webhook_url else {}
+        handle = fal_client.submit(
+            self.MODEL_NAME,
+            arguments={
+                "image_url": image_url,
+                "prompt": prompt,
+                "duration": duration,
+                "resolution": "auto",
+                "aspect_ratio": aspect_ratio
+            },
+            **submit_kwargs
+        )
+
+        _submitted_inputs.set(handle.request_id, {'rejection_key': rejection_key})
+
+        logger.info("📨 Video job submitted: %s", handle.request_id)
+        return handle
+
+    def _check_policy(self, image_data: bytes, prompt: str) -> str:
+        """
+        明らかに拒否される入力をアップロード・生成の前にエラーにする
+
+        Args:
+            image_data: 入力画像のバイトデータ
+            prompt: 動画生成のプロンプト
+
+        Returns:
+            拒否された場合に記録するキー
+
+        Raises:
+            ContentPolicyViolationError: 不適切な語句を含む、または以前拒否された組み合わせの場合
+        """
+        if _PROMPT_BADWORDS.search(prompt):
+            raise ContentPolicyViolationError(
+                "プロンプトに不適切な表現が含まれているため、動画生成を中止しました。\n"
+                + _POLICY_VIOLATION_MESSAGE
+            )
+
+        rejection_key = _rejection_key(image_data, prompt)
+        if _policy_rejections.get(rejection_key):
+            raise ContentPolicyViolationError(
+                "同じ画像とプロンプトの組み合わせは、以前コンテンツポリシー違反により拒否されています。\n"
+                + _POLICY_VIOLATION_MESSAGE
+            )
+        return rejection_key
+
+    @staticmethod
+    def _record_rejection(request_id: Optional[str], error_msg: str) -> None:
+        """キューに投入したジョブがコンテンツポリシー違反で拒否されたことを記録"""
+        submitted = _submitted_inputs.get(request_id) if request_id else None
+        if submitted:
+            _policy_rejections.set(submitted['rejection_key'], {'error': error_msg})
+
+    def await_video(self, handle: fal_client.SyncRequestHandle) -> Dict[str, any]:
+        """
+        submit_video で投入したジョブの完了を待って結果を取得
+
+        Args:
+            handle: submit_video が返したリクエストハンドル
+
+        Returns:
+            {
+                'video_url': str,
+                'status': str
+            }
+
+        Raises:
+            ContentPolicyViolationError: コンテンツポリシー違反で拒否された場合
+            VideoGenerationError: その他の理由で生成に失敗した場合
+        """
+        try:
+            result = self._wait_for_result(handle)
+        except Exception as e:
+            parsed_error = self._parse_fal_error(e)
+            if parsed_error['type'] == 'content_policy_violation':
+                self._record_rejection(handle.request_id, parsed_error['msg'])
+                raise ContentPolicyViolationError(parsed_error['msg'])
+            raise VideoGenerationError(f"動画生成に失敗しました: {parsed_error['msg']}")
+
+        video_url = self._extract_video_url(result)
+        if not video_url:
+            raise VideoGenerationError("Video URL not found in response")
+
+        return {
+            'video_url': video_url,
+            'status': 'success'
+        }
+
+    def _wait_for_result(self, handle: fal_client.SyncRequestHandle) -> Dict:
+        """
+        ジョブの完了までステータスをポーリングして結果を取得
+        （fal_client のデフォルトの 0.1秒間隔では数分かかる動画生成で数千回の問い合わせになるため、
+          間隔を POLL_INITIAL_INTERVAL から POLL_MAX_INTERVAL まで倍々に伸ばす）
+
+        Args:
+            handle: fal-ai のリクエストハンドル
+
+        Returns:
+            fal-ai のレスポンス
+
+        Raises:
+            VideoGenerationError: POLL_TIMEOUT 秒以内に完了しなかった場合
+        """
+        deadline = time.monotonic() + self.POLL_TIMEOUT
+        interval = self.POLL_INITIAL_INTERVAL
+        while not isinstance(handle.status(), fal_client.Completed):
+            if time.monotonic() >= deadline:
+                try:
+                    handle.cancel()
+                except Exception as e:
+                    logger.warning("⚠️ Failed to cancel video job %s: %s", handle.request_id, e)
+                raise VideoGenerationError(
+                    f"動画生成が{self.POLL_TIMEOUT:.0f}秒以内に完了しなかったためキャンセルしました"
+                )
+            time.sleep(interval)
+            interval = min(interval * 2, self.POLL_MAX_INTERVAL)
+
+        return handle.get()
+
+    def generate_many(self, jobs: List[Dict]) -> List[Dict[str, any]]:
+        """
+        複数の動画をまとめて生成（すべて投入してから完了を待つので fal-ai 側で並行して生成される）
+
+        Args:
+            jobs: submit_video の引数の辞書のリスト
+                  （例: [{'image_data': logo, 'prompt': '...', 'duration': 4}, ...]）
+
+        Returns:
+            jobs と同じ順序の結果のリスト
+            成功時は {'video_url': str, 'status': 'success'}、
+            失敗時は {'status': 'error', 'error': str, 'error_type': str}
+        """
+        handles = []
+        for job in jobs:
+            try:
+                handles.append(self.submit_video(**job))
+            except Exception as e:
+                handles.append(e)
+
+        results = []
+        for handle in handles:
+            try:
+                if isinstance(handle, Exception):
+                    raise handle
+                results.append(self.await_video(handle))
+            except ContentPolicyViolationError as e:
+                results.append({'status': 'error', 'error': str(e), 'error_type': 'content_policy_violation'})
+            except Exception as e:
+                results.append({'status': 'error', 'error': str(e), 'error_type': 'generation_error'})
+
+        return results
+
+    def parse_webhook_result(self, payload: dict) -> Dict[str, any]:
+        """
+        fal-ai の webhook で受け取った結果をパース
+
+        Args:
+            payload: webhook のリクエストボディ
+
+        Returns:
+            {
+                'status': 'success' または 'error',
+                'video_url': str (成功時),
+                'error': str (失敗時),
+                'error_type': str (失敗時)
+            }
+        """
+        result = payload.get('payload') or {}
+
+        if payload.get('status') == 'OK':
+            video_url = self._extract_video_url(result)
+            if video_url:
+                return {'status': 'success', 'video_url': video_url}
+            return {
+                'status': 'error',
+                'error': "Video URL not found in response",
+                'error_type': 'unknown'
+            }
+
+        # エラー詳細は "[{...}]" 形式で返ってくるので既存のパーサーに渡す
+        detail = result.get('detail')
+        error_str = orjson.dumps(detail).decode('utf-8') if detail else str(payload.get('error', ''))
+        parsed_error = self._parse_fal_error(Exception(error_str))
+        if parsed_error['type'] == 'content_policy_violation':
+            self._record_rejection(payload.get('request_id'), parsed_error['msg'] or error_str)
+
+        return {
+            'status': 'error',
+            'error': parsed_error['msg'] or error_str,
+            'error_type': parsed_error['type']
+        }
+
+    def _extract_video_url(self, result: Dict) -> Optional[str]:
+        """
+        fal-ai のレスポンスから動画URLを取得
+
+        Args:
+            result: fal-ai のレスポンス
+
+        Returns:
+            動画URL（含まれていない場合は None、レスポンス全体はログに出力）
+        """
+        video = result.get('video')
+        video_url = video.get('url') if isinstance(video, dict) else None
+        if not video_url:
+            logger.error("❌ fal response missing video url: %r", result)
+        return video_url
+
     def _parse_fal_error(self, exception: Exception) -> dict:
         """
         fal.ai APIのエラーをパースして構造化データを取得
@@ -138,32 +554,26 @@ class VideoGenerator:
                 'details': dict  # その他の詳細情報
             }
         """
-        import json
-
         error_str = str(exception)
 
-        # JSON配列としてパースを試みる
-        try:
-            # "[{...}]" 形式の文字列をパース
-            if error_str.startswith('[') and error_str.endswith(']'):
-                error_list = json.loads(error_str)
-                if error_list and isinstance(error_list, list):
-                    # 最初のエラーオブジェクトを使用
-                    first_error = error_list[0]
-                    return {
-                        'type': first_error.get('type', ''),
-                        'msg': first_error.get('msg', ''),
-                        'details': first_error
-                    }
-        except (json.JSONDecodeError, KeyError, IndexError):
-            pass
+        # "[{...}]" 形式の文字列の場合のみ JSON配列としてパースを試みる
+        if len(error_str) > 2 and error_str[0] == '[' and error_str[-1] == ']':
+            try:
+                error_list = orjson.loads(error_str)
+            except orjson.JSONDecodeError:
+                error_list = None
 
-        # パース失敗時は文字列から推測
-        error_lower = error_str.lower()
+            if error_list and isinstance(error_list, list) and isinstance(error_list[0], dict):
+                # 最初のエラーオブジェクトを使用
+                first_error = error_list[0]
+                return {
+                    'type': first_error.get('type', ''),
+                    'msg': first_error.get('msg', ''),
+                    'details': first_error
+                }
 
-        # 'type': 'content_policy_violation' のパターンを探す
-        if 'content_policy_violation' in error_lower or \
-           ('content' in error_lower and 'policy' in error_lower):
+        # パース失敗時は文字列から推測（'type': 'content_policy_violation' などのパターンを探す）
+        if _POLICY_RE.search(error_str):
             return {
                 'type': 'content_policy_violation',
                 'msg': error_str,
@@ -180,6 +590,7 @@ class VideoGenerator:
     def _upload_image(self, image_data: bytes) -> str:
         """
         画像を fal-ai にアップロードして URL を取得
+        （同じ画像データはアップロード済みのURLを再利用する）
 
         Args:
             image_data: 画像のバイトデータ
@@ -187,89 +598,52 @@ class VideoGenerator:
         Returns:
             アップロードされた画像のURL
         """
+        cache_key = hashlib.sha256(image_data).hexdigest()
+        cached = _upload_cache.get(cache_key)
+        if cached:
+            return cached['url']
+
         try:
             # fal_client のファイルアップロード機能を使用
-            print(f"📤 Uploading image ({len(image_data)} bytes)...")
-            upload_result = fal_client.upload(
-                image_data,
-                "image/jpeg"
-            )
-            print(f"✅ Upload result: {upload_result}")
+            content_type = self._detect_image_type(image_data)
+            logger.debug("📤 Uploading image (%d bytes, %s)...", len(image_data), content_type)
+            upload_result = fal_client.upload(image_data, content_type)
+            logger.debug("✅ Upload result: %s", upload_result)
+            _upload_cache.set(cache_key, {'url': upload_result})
             return upload_result
         except Exception as e:
-            print(f"❌ Upload failed: {str(e)}")
+            logger.error("❌ Upload failed: %s", e)
             raise Exception(f"Failed to upload image: {str(e)}")
 
+    @staticmethod
+    def _detect_image_type(image_data: bytes) -> str:
+        """先頭のマジックナンバーから画像の Content-Type を判定（不明な場合は JPEG として扱う）"""
+        if image_data[:8] == b'\x89PNG\r\n\x1a\n':
+            return 'image/png'
+        if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+            return 'image/webp'
+        if image_data[:6] in (b'GIF87a', b'GIF89a'):
+            return 'image/gif'
+        return 'image/jpeg'
+
     def trim_video(self, video_url: str, start_time: float = 0.3, square_crop: bool = False) -> bytes:
         """
         動画をトリミング（開始時間カット + オプションで正方形クロップ）
 
         Args:
-            video_url: トリミングする動画のURL
+            video_url: トリミングする動画のURL（ダウンロード済みのローカルファイルのパスも可）
             start_time: 開始時間（秒）。この時間以降の動画を使用
             square_crop: Trueの場合、中央を正方形にクロップ
 
         Returns:
             トリミング後の動画のバイトデータ
         """
-        import tempfile
-        import os
-        from moviepy.editor import VideoFileClip
-
-        # 動画をダウンロード
-        response = requests.get(video_url, timeout=60)
-        response.raise_for_status()
-
-        # 一時ファイルに保存
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_input:
-            tmp_input.write(response.content)
-            input_path = tmp_input.name
+        # 正方形クロップは中央を min(幅, 高さ) の正方形で切り出す（サイズ取得のための ffprobe は不要）
+        video_filter = "crop='min(iw,ih)':'min(iw,ih)'" if square_crop else None
 
         try:
-            # moviepyで動画を読み込み
-            clip = VideoFileClip(input_path)
-
-            # 開始時間以降を切り出し
-            if start_time > 0:
-                clip = clip.subclip(start_time)
-
-            # 正方形クロップが必要な場合
-            if square_crop:
-                width, height = clip.size
-                square_size = min(width, height)
-                x_center = width / 2
-                y_center = height / 2
-                x1 = x_center - square_size / 2
-                y1 = y_center - square_size / 2
-                clip = clip.crop(x1=x1, y1=y1, width=square_size, height=square_size)
-
-            # 一時ファイルに書き出し
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_output:
-                output_path = tmp_output.name
-
-            clip.write_videofile(
-                output_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile=tempfile.mktemp(suffix='.m4a'),
-                remove_temp=True,
-                logger=None
-            )
-
-            # トリミング後の動画を読み込み
-            with open(output_path, 'rb') as f:
-                video_data = f.read()
-
-            # クリーンアップ
-            clip.close()
-            os.unlink(input_path)
-            os.unlink(output_path)
-
-            return video_data
-
+            return self._process_video(video_url, start_time, video_filter)
         except Exception as e:
-            if os.path.exists(input_path):
-                os.unlink(input_path)
             raise Exception(f"Failed to trim video: {str(e)}")
 
     def add_letterbox_to_square(self, video_url: str, start_time: float = 0.3) -> bytes:
@@ -277,101 +651,167 @@ class VideoGenerator:
         横長動画の上下に黒い背景を追加して正方形にする
 
         Args:
-            video_url: 動画のURL
+            video_url: 動画のURL（ダウンロード済みのローカルファイルのパスも可）
             start_time: 開始時間（秒）。この時間以降の動画を使用
 
         Returns:
             正方形動画のバイトデータ
         """
-        import tempfile
-        import os
-        from moviepy.editor import VideoFileClip, ColorClip, CompositeVideoClip
+        # 長辺（横長動画では幅）に合わせた正方形の黒背景の中央に動画を配置
+        video_filter = "pad='max(iw,ih)':'max(iw,ih)':(ow-iw)/2:(oh-ih)/2:black"
+
+        try:
+            return self._process_video(video_url, start_time, video_filter)
+        except Exception as e:
+            raise Exception(f"Failed to add letterbox: {str(e)}")
 
-        # 動画をダウンロード
-        response = requests.get(video_url, timeout=60)
-        response.raise_for_status()
+    def _process_video(self, video_url_or_path: str, start_time: float, video_filter: Optional[str]) -> bytes:
+        """
+        動画を ffmpeg で加工してバイトデータを取得
+        （一時ファイルは1つの一時ディレクトリにまとめ、エラー時も含めて必ず削除する）
+        ffmpeg の実行中のみ _postprocess_slots を取得し、同時実行数を MAX_CONCURRENT_POSTPROCESS までに抑える
 
-        # 一時ファイルに保存
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_input:
-            tmp_input.write(response.content)
-            input_path = tmp_input.name
+        Args:
+            video_url_or_path: 動画のURL、またはローカルファイルのパス
+            start_time: 開始時間（秒）
+            video_filter: ffmpeg の映像フィルター
 
-        try:
-            # moviepyで動画を読み込み
-            clip = VideoFileClip(input_path)
+        Returns:
+            加工後の動画のバイトデータ
+        """
+        import tempfile
 
-            # 開始時間以降を切り出し
-            if start_time > 0:
-                clip = clip.subclip(start_time)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # ダウンロードは CPU を使わないので、同時実行数の制限は ffmpeg の実行中のみにする
+            input_path = self._ensure_local(video_url_or_path, tmp_dir)
+            output_path = os.path.join(tmp_dir, 'out.mp4')
 
-            # 動画のサイズを取得
-            width, height = clip.size
+            with _postprocess_slots:
+                self._ffmpeg_trim(input_path, output_path, start_time, video_filter=video_filter)
 
-            # 正方形のサイズを決定（幅に合わせる）
-            square_size = width
+            with open(output_path, 'rb') as f:
+                return f.read()
 
-            # 黒い背景を作成
-            background = ColorClip(
-                size=(square_size, square_size),
-                color=(0, 0, 0),
-                duration=clip.duration
-            )
+    def _ensure_local(self, video_url_or_path: str, tmp_dir: str) -> str:
+        """
+        動画のローカルパスを取得（URLの場合は一時ディレクトリにダウンロード）
 
-            # 動画を中央に配置
-            y_offset = (square_size - height) // 2
-            clip = clip.set_position(('center', y_offset))
+        Args:
+            video_url_or_path: 動画のURL、またはローカルファイルのパス
+            tmp_dir: ダウンロード先の一時ディレクトリ
 
-            # 背景と動画を合成
-            final_clip = CompositeVideoClip([background, clip])
+        Returns:
+            ローカルファイルのパス
+        """
+        if not video_url_or_path.startswith(('http://', 'https://')):
+            return video_url_or_path
 
-            # 一時ファイルに書き出し
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_output:
-                output_path = tmp_output.name
+        input_path = os.path.join(tmp_dir, 'in.mp4')
+        with open(input_path, 'wb') as f:
+            self.download_video(video_url_or_path, f)
+        return input_path
 
-            final_clip.write_videofile(
-                output_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile=tempfile.mktemp(suffix='.m4a'),
-                remove_temp=True,
-                logger=None
-            )
+    def _ffmpeg_trim(
+        self,
+        input_path: str,
+        output_path: str,
+        start_time: float,
+        video_filter: Optional[str] = None
+    ) -> None:
+        """
+        ffmpeg で動画の先頭をカット（音声は再エンコードせずにコピー）
+        カット・クロップ・エンコードを1回の ffmpeg 実行で行い、フレームを Python 側に展開しない
 
-            # 処理後の動画を読み込み
-            with open(output_path, 'rb') as f:
-                video_data = f.read()
+        映像は -c copy だとキーフレーム（通常は先頭フレーム）までしか切れず
+        0.3秒のカットにならないため、映像のみ再エンコードする
+        ハードウェアエンコーダーが使える場合は優先し、失敗した場合は libx264 で再実行する
+
+        Args:
+            input_path: 入力動画のパス
+            output_path: 出力動画のパス
+            start_time: 開始時間（秒）
+            video_filter: ffmpeg の映像フィルター（例: クロップ）
+        """
+        import subprocess
+
+        args = [_ffmpeg_exe(), '-y', '-loglevel', 'error', '-ss', str(start_time), '-i', input_path]
+        if video_filter:
+            args += ['-vf', video_filter]
 
-            # クリーンアップ
-            clip.close()
-            final_clip.close()
-            background.close()
-            os.unlink(input_path)
-            os.unlink(output_path)
+        failed_encoders = []
+        for name, encoder_args in _h264_encoders():
+            try:
+                subprocess.run(
+                    args + encoder_args + ['-c:a', 'copy', '-movflags', '+faststart', output_path],
+                    check=True,
+                    capture_output=True
+                )
+            except subprocess.CalledProcessError as e:
+                if name == 'libx264':
+                    # libx264 でも失敗した場合は入力動画の問題なので、ハードウェアエンコーダーは使い続ける
+                    raise Exception(f"ffmpeg failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+                logger.warning("⚠️ %s で失敗したため次のエンコーダーで再実行します", name)
+                failed_encoders.append(name)
+                continue
+
+            # 同じ入力を libx264 では処理できた場合のみ、ハードウェアエンコーダー自体が使えないと判断する
+            # （ドライバーやGPUがない環境ではビルドに含まれていても使えないので以降は使わない）
+            if failed_encoders and name == 'libx264':
+                logger.warning("⚠️ %s が使用できないため以降は libx264 を使用します", ', '.join(failed_encoders))
+                _UNUSABLE_ENCODERS.update(failed_encoders)
+            return
+
+    def download_video(self, video_url: str, sink: BinaryIO, chunk_size: int = 1 << 20) -> int:
+        """
+        生成された動画をダウンロードしてファイルに書き込む（動画全体をメモリに載せない）
 
-            return video_data
+        Args:
+            video_url: 動画のURL
+            sink: 書き込み先のファイルオブジェクト（バイナリモード）
+            chunk_size: 1回に読み込むバイト数（ファイル書き込みなので大きめにしてループ回数を減らす）
 
+        Returns:
+            書き込んだバイト数
+        """
+        total = 0
+        try:
+            for chunk in self.stream_video(video_url, chunk_size=chunk_size):
+                sink.write(chunk)
+                total += len(chunk)
         except Exception as e:
-            if os.path.exists(input_path):
-                os.unlink(input_path)
-            raise Exception(f"Failed to add letterbox: {str(e)}")
+            raise Exception(f"Failed to download video: {str(e)}")
+        return total
 
-    def download_video(self, video_url: str) -> bytes:
+    def stream_video(self, video_url: str, chunk_size: int = 65536) -> Iterator[bytes]:
         """
-        生成された動画をダウンロード
+        生成された動画をチャンク単位でダウンロード（動画全体をメモリに載せない）
 
         Args:
             video_url: 動画のURL
+            chunk_size: 1回に読み込むバイト数
 
         Returns:
-            動画のバイトデータ
+            動画のバイトデータを順に返すイテレーター
         """
+        # HTTPエラーはレスポンス送信前に検出できるよう、接続だけ先に確立する
+        try:
+            response = self._session.get(video_url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        except Exception as e:
+            raise Exception(f"Failed to download video: {str(e)}")
+
         try:
-            response = requests.get(video_url, timeout=60)
             response.raise_for_status()
-            return response.content
         except Exception as e:
+            # 本文を読まずに返すとコネクションがプールに戻らないので閉じておく
+            response.close()
             raise Exception(f"Failed to download video: {str(e)}")
 
+        def generate():
+            with response:
+                yield from response.iter_content(chunk_size)
+
+        return generate()
+
     def generate_logo_video(self, image_data: bytes) -> Dict[str, any]:
         """
         ロゴ用の動画を生成
@@ -398,7 +838,7 @@ class VideoGenerator:
             動画生成結果
         """
         if not prompt:
-            prompt = "Make this character dance with lively and fun movements. Add energetic body language and natural motion."
+            prompt = self.DEFAULT_CHARACTER_PROMPT
 
         # 1:1の場合は9:16で生成
         actual_ratio = "9:16" if aspect_ratio == "1:1" else aspect_ratio
@@ -417,42 +857,39 @@ class VideoGenerator:
         video_url = result.get('video_url')
 
         # ポストプロセス
+        # 動画は fal-ai の CDN から1回だけ一時ディレクトリにダウンロードし、以降の加工ではローカルファイルを使う
+        import tempfile
+
         try:
-            if aspect_ratio == "1:1":
-                # 1:1の場合: 縦長動画の中央を正方形にクロップ
-                print("✂️ 動画をトリミング中...")
-                print("   - 最初0.3秒をカット")
-                print("   - 中央を正方形にクロップ")
-
-                trimmed_video_data = self.trim_video(
-                    video_url,
-                    start_time=0.3,
-                    square_crop=True
-                )
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                local_path = self._ensure_local(video_url, tmp_dir)
+
+                if aspect_ratio == "1:1":
+                    # 1:1の場合: 縦長動画の中央を正方形にクロップ
+                    logger.info("✂️ 動画をトリミング中（最初0.3秒をカット、中央を正方形にクロップ）...")
+
+                    trimmed_video_data = self.trim_video(
+                        local_path,
+                        start_time=0.3,
+                        square_crop=True
+                    )
+                else:
+                    # 16:9, 9:16の場合: 最初0.3秒のみトリミング
+                    logger.info("✂️ 動画をトリミング中（最初0.3秒をカット）...")
 
-                return {
-                    'video_data': trimmed_video_data,
-                    'status': 'success',
-                    'trimmed': True
-                }
-            else:
-                # 16:9, 9:16の場合: 最初0.3秒のみトリミング
-                print("✂️ 動画をトリミング中...")
-                print("   - 最初0.3秒をカット")
-
-                trimmed_video_data = self.trim_video(
-                    video_url,
-                    start_time=0.3,
-                    square_crop=False
-                )
+                    trimmed_video_data = self.trim_video(
+                        local_path,
+                        start_time=0.3,
+                        square_crop=False
+                    )
 
-                return {
-                    'video_data': trimmed_video_data,
-                    'status': 'success',
-                    'trimmed': True
-                }
+            return {
+                'video_data': trimmed_video_data,
+                'status': 'success',
+                'trimmed': True
+            }
         except Exception as e:
-            logger.error(f"❌ Video post-processing failed: {str(e)}")
+            logger.error("❌ Video post-processing failed: %s", e)
             raise VideoGenerationError(f"動画の後処理に失敗しました: {str(e)}")
 
     def generate_character_video_batch(
@@ -485,7 +922,7 @@ class VideoGenerator:
         """
         # デフォルトプロンプト
         if not prompt:
-            prompt = "Make this character dance with lively and fun movements. Add energetic body language and natural motion."
+            prompt = self.DEFAULT_CHARACTER_PROMPT
 
         # 生成する動画の仕様
         video_specs = [
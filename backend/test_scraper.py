@@ -1,66 +1,201 @@
 #!/usr/bin/env python3
 """
 画像スクレイピングのテストスクリプト
+
+使い方: python test_scraper.py [--debug] [URL ...]（URL省略時はデフォルトのテストURL）
+  --debug: キャラクター画像が見つからない場合に、どのセレクタならマッチするかを調べる
 """
+import argparse
+import os
+import re
+import sys
+import soupsieve as sv
+from concurrent.futures import ThreadPoolExecutor
 from services.scraper import ImageScraper
 
 # テストURL
-test_url = "https://lp.wonder-ma.com/7206/Truck-Olive"
+DEFAULT_TEST_URL = "https://lp.wonder-ma.com/7206/Truck-Olive"
+
+# 同時に取得するページ数
+MAX_WORKERS = 8
+
+# 診断用の再取得のタイムアウト（接続, 読み込み）（秒）
+# 応答しないサーバーでスクリプト全体が止まらないようにする（リトライは共有セッション側で行う）
+FETCH_TIMEOUT = (3.05, 10)
+
+# SCRAPER_DEBUG_VERBOSE=1 の場合は、生のHTMLで候補が見つかった場合やマッチするセレクタが見つかった後も
+# 代替セレクタをすべて試す
+VERBOSE = os.getenv('SCRAPER_DEBUG_VERBOSE', '').lower() in ('1', 'true', 'yes')
 
-print(f"🔍 Testing image extraction from: {test_url}\n")
+# ImageScraper が使っているセレクタ（services/scraper.py と同じく import 時に1回だけコンパイルする）
+MAIN_SELECTOR = '.wonder-cv .wonder-cv-wrapper .wonder-cv-back-person-img'
+_MAIN_SEL = sv.compile(MAIN_SELECTOR)
 
-scraper = ImageScraper(test_url)
-result = scraper.extract_images()
+# 代替セレクタ
+# 単一クラスの検索は CSS エンジンを通さず find_all で行う（表示用のセレクタ, タグ名, クラス名）
+CLASS_LOOKUPS = [
+    ('.wonder-cv-back-person-img', None, 'wonder-cv-back-person-img'),
+    ('img.wonder-cv-back-person-img', 'img', 'wonder-cv-back-person-img'),
+]
+# CSS セレクタが必要なもの（表示用のセレクタ, コンパイル済みのセレクタ）
+CSS_SELECTORS = [
+    (selector, sv.compile(selector))
+    for selector in [
+        '.wonder-cv img',
+    ]
+]
+# クラス名の部分一致（[class*="person"] / [class*="character"] / [class*="cv"] を1回の走査で調べる）
+# CSS セレクタではないので、表示は正規表現であることがわかる形にする
+PERSON_RE = re.compile(r'person|character|cv')
+PERSON_LABEL = f'class~/{PERSON_RE.pattern}/'
 
-print(f"📊 Results:")
-print(f"  ✅ Logo URL: {result['logo_url']}")
-print(f"  👤 Character URL: {result['character_url']}")
+# 上記のクラスを持つ <img> の src を生のHTML（バイト列）から直接探すパターン（DOM構築前の事前チェック用）
+# class 属性は src の前後どちらにあってもよい
+IMG_RE = re.compile(
+    rb'<img\b(?=[^>]*\bclass=["\'][^"\']*(?:person|character|cv))[^>]*\bsrc=["\']([^"\']+)["\']',
+    re.IGNORECASE
+)
 
-if result['logo_url']:
-    print(f"\n✅ Logo image found!")
-else:
-    print(f"\n❌ Logo image NOT found")
 
-if result['character_url']:
-    print(f"✅ Character image found!")
-else:
-    print(f"❌ Character image NOT found")
-    print(f"\n💡 Checking CSS selector...")
+def extract(test_url):
+    """画像を抽出（失敗した場合は例外を返す）"""
+    try:
+        return ImageScraper(test_url).extract_images()
+    except Exception as e:
+        return e
 
+
+def diagnose(test_url, lines):
+    """キャラクター画像が見つからない場合に、どのセレクタならマッチするかを調べる（結果は lines に追加）"""
     # CSSセレクタを確認
     import requests
-    from bs4 import BeautifulSoup
+    from collections import defaultdict
+    from bs4 import BeautifulSoup, SoupStrainer
+    from services.http import get_html
+
+    # 調べるセレクタはすべて person / character / cv / wonder を含むクラスの要素（とその子孫）が対象なので、
+    # それ以外の要素はパースしない
+    strainer = SoupStrainer(class_=re.compile(r'person|character|cv|wonder'))
 
-    response = requests.get(test_url)
-    soup = BeautifulSoup(response.content, 'html.parser')
+    # ImageScraper と同じく上限サイズまでに制限して取得（共有セッションのキャッシュも使われる）
+    try:
+        html = get_html(test_url, timeout=FETCH_TIMEOUT)
+    except requests.Timeout:
+        lines.append(f"  ❌ Timed out fetching page (connect {FETCH_TIMEOUT[0]}s / read {FETCH_TIMEOUT[1]}s)")
+        return
+    except requests.RequestException as e:
+        # 共有セッションのリトライを使い切ったタイムアウトは ConnectionError（MaxRetryError）になる
+        lines.append(f"  ❌ Failed to fetch page: {e}")
+        return
+
+    # まずはDOMを構築せずに生のHTMLから候補を探す（見つかった場合は代替セレクタを試さない）
+    candidates = list(dict.fromkeys(IMG_RE.findall(html)))
+    if candidates:
+        lines.append(f"  ✅ Found {len(candidates)} <img> candidate(s) in raw HTML")
+        for i, src in enumerate(candidates[:3]):  # 最大3つまで表示
+            lines.append(f"     [{i}] <img src='{src.decode('utf-8', 'replace')}'>")
+
+    soup = BeautifulSoup(html, 'lxml', parse_only=strainer)
 
     # 現在のセレクタで検索
-    selector = '.wonder-cv .wonder-cv-wrapper .wonder-cv-back-person-img'
-    element = soup.select_one(selector)
-    print(f"  Current selector: {selector}")
-    print(f"  Found element: {element is not None}")
+    element = _MAIN_SEL.select_one(soup)
+    lines.append(f"  Current selector: {MAIN_SELECTOR}")
+    lines.append(f"  Found element: {element is not None}")
 
     if element:
-        print(f"  Element tag: {element.name}")
-        print(f"  Element attributes: {element.attrs}")
+        lines.append(f"  Element tag: {element.name}")
+        lines.append(f"  Element attributes: {element.attrs}")
 
-    # 代替セレクタを試す
-    alternative_selectors = [
-        '.wonder-cv-back-person-img',
-        'img.wonder-cv-back-person-img',
-        '.wonder-cv img',
-        '[class*="person"]',
-        '[class*="character"]',
-        '[class*="cv"]'
-    ]
+    if candidates and not VERBOSE:
+        return
 
-    print(f"\n🔍 Trying alternative selectors...")
-    for alt_selector in alternative_selectors:
-        elements = soup.select(alt_selector)
+    # ツリーを1回だけ走査して、クラス名 → 要素の索引と部分一致する要素の一覧を作る（どちらも文書順）
+    class_index = defaultdict(list)
+    person_elements = []
+    for elem in soup.find_all(True):
+        classes = elem.get('class') or []
+        for class_name in classes:
+            class_index[class_name].append(elem)
+        # 3つの部分一致は1つの正規表現にまとめる（同じ要素が重複して表示されることもなくなる）
+        if any(PERSON_RE.search(class_name) for class_name in classes):
+            person_elements.append(elem)
+
+    # 代替セレクタを試す（索引で引けるもの → CSS セレクタ → 部分一致の順）
+    def alternative_results():
+        for label, name, class_name in CLASS_LOOKUPS:
+            yield label, [elem for elem in class_index.get(class_name, []) if name is None or elem.name == name]
+        for alt_selector, compiled in CSS_SELECTORS:
+            yield alt_selector, compiled.select(soup)
+        yield PERSON_LABEL, person_elements
+
+    lines.append(f"\n🔍 Trying alternative selectors...")
+    for alt_selector, elements in alternative_results():
         if elements:
-            print(f"  ✅ '{alt_selector}' found {len(elements)} element(s)")
+            lines.append(f"  ✅ '{alt_selector}' found {len(elements)} element(s)")
+            found_img = False
             for i, elem in enumerate(elements[:3]):  # 最大3つまで表示
                 if elem.name == 'img' and elem.get('src'):
-                    print(f"     [{i}] <img src='{elem.get('src')}'>")
+                    lines.append(f"     [{i}] <img src='{elem.get('src')}'>")
+                    found_img = True
                 else:
-                    print(f"     [{i}] {elem.name} - {elem.get('class')}")
+                    lines.append(f"     [{i}] {elem.name} - {elem.get('class')}")
+
+            # 使えるセレクタが見つかったら残りは試さない
+            if found_img and not VERBOSE:
+                break
+
+
+def report(test_url, result, debug=False):
+    """抽出結果を表示（1URL分の出力をまとめて1回で書き出す）"""
+    lines = []
+    try:
+        _report(test_url, result, lines, debug)
+    finally:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def _report(test_url, result, lines, debug):
+    """抽出結果の表示内容を lines に追加"""
+    lines.append(f"🔍 Testing image extraction from: {test_url}\n")
+
+    if isinstance(result, Exception):
+        lines.append(f"❌ {result}")
+        return
+
+    lines.append(f"📊 Results:")
+    lines.append(f"  ✅ Logo URL: {result['logo_url']}")
+    lines.append(f"  👤 Character URL: {result['character_url']}")
+
+    if result['logo_url']:
+        lines.append(f"\n✅ Logo image found!")
+    else:
+        lines.append(f"\n❌ Logo image NOT found")
+
+    if result['character_url']:
+        lines.append(f"✅ Character image found!")
+    else:
+        lines.append(f"❌ Character image NOT found")
+        if debug:
+            lines.append(f"\n💡 Checking CSS selector...")
+            diagnose(test_url, lines)
+        else:
+            lines.append(f"\n💡 Run with --debug to check which selector matches")
+
+
+def main(test_urls, debug=False):
+    """各URLから画像を抽出して結果を表示"""
+    # ページの取得・抽出は並列に行い（共有セッションでコネクションを再利用）、結果はURLの順に表示する
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(test_urls))) as executor:
+        results = list(executor.map(extract, test_urls))
+
+    for test_url, result in zip(test_urls, results):
+        report(test_url, result, debug)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='画像スクレイピングのテスト')
+    parser.add_argument('urls', nargs='*', metavar='URL', help='テストするページのURL')
+    parser.add_argument('--debug', action='store_true', help='キャラクター画像が見つからない場合にセレクタを診断する')
+    args = parser.parse_args()
+
+    main(args.urls or [DEFAULT_TEST_URL], debug=args.debug)
@@ -4,11 +4,35 @@ import './VideoGenerator.css'
 import { API_BASE_URL } from '../config'
 
 interface VideoResult {
+  job_id?: string
   video_url?: string
   status?: string
   error?: string
 }
 
+// 動画生成ジョブのポーリング間隔（ミリ秒）
+const JOB_POLL_INTERVAL_MS = 5000
+
+// 動画生成ジョブの完了を待つ最大時間（ミリ秒、バックエンドの FAL_POLL_TIMEOUT より長くする）
+const JOB_TIMEOUT_MS = 25 * 60 * 1000
+
+// 動画生成ジョブが完了（success / error）するまで状態を取得し続ける
+const waitForJob = async (jobId: string): Promise<VideoResult> => {
+  const deadline = Date.now() + JOB_TIMEOUT_MS
+  while (true) {
+    if (Date.now() >= deadline) {
+      return { job_id: jobId, status: 'error', error: '動画生成がタイムアウトしました' }
+    }
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+    const response = await axios.get(`${API_BASE_URL}/api/job/${jobId}`)
+    const job: VideoResult = response.data
+    console.log('⏳ Job status:', job.status)
+    if (job.status !== 'queued' && job.status !== 'running') {
+      return job
+    }
+  }
+}
+
 const VideoGenerator: React.FC = () => {
   const [pageUrl, setPageUrl] = useState('')
   const [prompt, setPrompt] = useState('')
@@ -173,8 +197,15 @@ const VideoGenerator: React.FC = () => {
         character_image_url: characterImageUrl || undefined
       })
 
-      console.log('✅ Response received:', response.data)
-      setResult(response.data)
+      // 生成済み（キャッシュ）の場合は完了済みのジョブが返ってくる
+      let job: VideoResult = response.data
+      if (job.job_id && (job.status === 'queued' || job.status === 'running')) {
+        console.log('✅ Job queued:', job)
+        job = await waitForJob(job.job_id)
+      }
+
+      console.log('✅ Job finished:', job)
+      setResult(job)
     } catch (err: any) {
       console.error('❌ Error occurred:', err)
       console.error('Error response:', err.response?.data)
@@ -1,4 +1,4 @@
 #!/bin/bash
 cd backend
 source venv/bin/activate
-python3 app.py
+FLASK_ENV=development python3 app.py